@@ -0,0 +1,121 @@
+import threading
+
+
+# Pioneer600 wiring of the expander, all active low
+KEYS = 0x0F             # joystick left, up, down, right (inputs)
+LED = 0x10
+BUZZER = 0x80
+OUTPUTS = {'led': LED, 'buzzer': BUZZER}
+
+# Buzzer and LED three times at 100 ms, e.g. before shutting down
+BEEP_3X = [({'buzzer', 'led'}, 0.1), (set(), 0.1)] * 3
+
+
+class PCF8574:
+    """
+    Driver of a PCF8574 I/O expander that keeps a shadow copy of its output
+    latch.
+
+    The chip has no direction register: a pin written high is weak and reads
+    back what drives it, a pin written low is pulled down. Changing outputs
+    with a read-modify-write would latch a held key low, so outputs are
+    changed in the shadow latch and written with a single byte write, and
+    inputs are read with a single byte read.
+    """
+
+    def __init__(self, bus, address=0x20, latch=0xFF):
+        self.bus = bus
+        self.address = address
+        # Everything high: keys readable, LED and buzzer off
+        self.latch = latch
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pattern = None
+
+    def begin(self):
+        """Writes the shadow latch to the chip, releasing the input pins."""
+        with self._lock:
+            self.bus.write_byte(self.address, self.latch)
+        return self
+
+    def read(self):
+        """
+        Returns:
+            int: Level of all eight pins.
+        """
+        return self.bus.read_byte(self.address)
+
+    def write(self, mask, value):
+        """
+        Sets the pins in mask to the bits of value with one byte write, if
+        that changes the latch.
+        """
+        with self._lock:
+            latch = (self.latch & ~mask | value & mask) & 0xFF
+            if latch != self.latch:
+                self.bus.write_byte(self.address, latch)
+                self.latch = latch
+
+    def set_outputs(self, on):
+        """
+        Switches the named outputs in on ('led', 'buzzer') on and the others off.
+        """
+        mask = 0
+        for pins in OUTPUTS.values():
+            mask |= pins
+        value = mask
+        for name in on:
+            value &= ~OUTPUTS[name]
+        self.write(mask, value)
+
+    def led(self, on):
+        self.write(LED, 0 if on else LED)
+
+    def buzzer(self, on):
+        self.write(BUZZER, 0 if on else BUZZER)
+
+    def play(self, pattern, on_done=None):
+        """
+        Plays a pattern of (outputs on, seconds) steps from a background
+        timer, replacing any pattern still playing. Returns immediately.
+
+        Args:
+            pattern: Steps like BEEP_3X; everything is switched off after the last.
+            on_done: Called from the timer thread once the pattern finished.
+        """
+        self.cancel()
+        self._pattern = (list(pattern), on_done)
+        self._step(self._pattern, 0)
+
+    def cancel(self):
+        """Stops a playing pattern and switches the outputs off."""
+        timer = self._timer
+        self._pattern = None
+        if timer is not None:
+            timer.cancel()
+        self.set_outputs(())
+
+    def playing(self):
+        return self._pattern is not None
+
+    def _step(self, pattern, index):
+        # A newer pattern replaced this one
+        if self._pattern is not pattern:
+            return
+        steps, on_done = pattern
+        try:
+            if index == len(steps):
+                self._pattern = None
+                self.set_outputs(())
+                if on_done is not None:
+                    on_done()
+                return
+            on, seconds = steps[index]
+            self.set_outputs(on)
+        except OSError as e:
+            self._pattern = None
+            print(f"Error driving the buzzer and LED: {e}")
+            return
+        self._timer = threading.Timer(seconds, self._step, (pattern, index + 1))
+        self._timer.daemon = True
+        self._timer.start()
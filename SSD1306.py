@@ -1,7 +1,22 @@
-import spidev 
-import RPi.GPIO as GPIO
+from hal import GPIO
 import time
 
+# NumPy is optional, the pure-Python packer below is used without it.
+# It is imported on the first pack, importing it takes a while on a Pi.
+numpy = None
+_numpy_checked = False
+
+def load_numpy():
+	"""Import NumPy if available. Returns the module or None."""
+	global numpy, _numpy_checked
+	if not _numpy_checked:
+		try:
+			import numpy
+		except ImportError:
+			numpy = None
+		_numpy_checked = True
+	return numpy
+
 # Constants
 SSD1306_SETCONTRAST = 0x81
 SSD1306_DISPLAYALLON_RESUME = 0xA4
@@ -37,15 +52,55 @@ SSD1306_RIGHT_HORIZONTAL_SCROLL = 0x26
 SSD1306_LEFT_HORIZONTAL_SCROLL = 0x27
 SSD1306_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL = 0x29
 SSD1306_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL = 0x2A
+# Horizontal scroll step interval in frames -> its setup code
+SCROLL_INTERVALS = {2: 0x07, 3: 0x04, 4: 0x05, 5: 0x00, 25: 0x06, 64: 0x01, 128: 0x02, 256: 0x03}
+
+# Largest single transfer accepted by the spidev kernel driver (bufsiz)
+SPI_MAX_TRANSFER = 4096
+
+# Spreads the 8 pixels of one packed image row byte (MSB = leftmost column)
+# into bit 0 of 8 consecutive bytes of a little-endian 64-bit word.
+_SPREAD = [sum(((v >> (7 - j)) & 1) << (8 * j) for j in range(8)) for v in range(256)]
+
+def _pack_numpy(raw, width, pages):
+	"""Pack row-major 1-bit image data into SSD1306 page order using NumPy."""
+	bits = numpy.unpackbits(numpy.frombuffer(raw, dtype=numpy.uint8))
+	bits = bits.reshape(pages, 8, width)
+	return bytearray(numpy.packbits(bits, axis=1, bitorder='little').tobytes())
+
+def _pack_python(raw, width, pages):
+	"""Pack row-major 1-bit image data into SSD1306 page order.
+	Transposes 8x8 pixel blocks with a lookup table instead of reading
+	every pixel on its own."""
+	stride = width // 8
+	spread = _SPREAD
+	out = bytearray(width * pages)
+	index = 0
+	for page in range(pages):
+		base = page * 8 * stride
+		r0, r1, r2, r3, r4, r5, r6, r7 = [raw[base + k*stride:base + (k+1)*stride] for k in range(8)]
+		for c in range(stride):
+			word = (spread[r0[c]] | spread[r1[c]] << 1 | spread[r2[c]] << 2 | spread[r3[c]] << 3 |
+				spread[r4[c]] << 4 | spread[r5[c]] << 5 | spread[r6[c]] << 6 | spread[r7[c]] << 7)
+			out[index:index+8] = word.to_bytes(8, 'little')
+			index += 8
+	return out
+
+def pack_buffer(raw, width, pages, allow_numpy=True):
+	"""Convert Image.tobytes() output of a mode '1' image into the page-ordered
+	display buffer (one byte per column per page, LSB = top row)."""
+	if allow_numpy and load_numpy() is not None:
+		return _pack_numpy(raw, width, pages)
+	return _pack_python(raw, width, pages)
 
 class SSD1306(object):
 	"""class for SSD1306  128*64 0.96inch OLED displays."""
 	
-	def __init__(self,rst,dc,spi):
+	def __init__(self,rst,dc,spi,spi_speed_hz=8000000,spi_mode=0):
 		self.width = 128
 		self.height = 64
 		self._pages = 8
-		self._buffer = [0]*(self.width*self._pages)
+		self._buffer = bytearray(self.width*self._pages)
 		#Initialize DC RST pin
 		self._dc = dc
 		self._rst = rst
@@ -55,53 +110,61 @@ class SSD1306(object):
 		GPIO.setup(self._rst,GPIO.OUT)
 		#Initialize SPI
 		self._spi = spi
+		if spi_speed_hz:
+			self._spi.max_speed_hz = spi_speed_hz
+		self._spi.mode = spi_mode
+		#Shadow copy of what the panel shows, used for partial refresh
+		self.partial_refresh = True
+		self._shadow = None
+		self.frame_bytes_sent = 0
+		self.frame_bytes_skipped = 0
+		#(page start, page end, left, frames) while the controller scrolls
+		self.scrolling = None
+		self.dimmed = False
+		self.asleep = False
 	def command(self,cmd):
 		"""Send command byte to display"""
+		self.commands(cmd)
+	def commands(self,*cmds):
+		"""Send a sequence of command bytes with one DC transition and one transfer"""
 		GPIO.output(self._dc,GPIO.LOW)
-		self._spi.writebytes([cmd])
-	def data(self,val):
-		"""Send byte of data to display"""
-		GPIO.output(self._dc,GPIO.HIGHT)
-		self._spi.writebytes([val])
+		self._spi.writebytes(list(cmds))
+	def data(self,buf):
+		"""Send a byte or a buffer of data bytes to display"""
+		if isinstance(buf, int):
+			buf = [buf]
+		GPIO.output(self._dc,GPIO.HIGH)
+		if hasattr(self._spi, 'writebytes2'):
+			# writebytes2 takes any buffer and splits it into bufsiz transfers itself
+			self._spi.writebytes2(buf)
+		else:
+			for start in range(0, len(buf), SPI_MAX_TRANSFER):
+				self._spi.writebytes(list(buf[start:start+SPI_MAX_TRANSFER]))
 	def begin(self,vccstate=SSD1306_SWITCHCAPVCC):
 		"""Initialize dispaly"""
 		self._vccstate = vccstate
 		self.reset()
-		self.command(SSD1306_DISPLAYOFF)                    # 0xAE
-		self.command(SSD1306_SETDISPLAYCLOCKDIV)            # 0xD5
-		self.command(0x80)                     # the suggested ra    tio 0x80
-		
-		self.command(SSD1306_SETMULTIPLEX)                  # 0xA8
-		self.command(0x3F)
-		self.command(SSD1306_SETDISPLAYOFFSET)              # 0xD3
-		self.command(0x0)                                   # no offset
-		self.command(SSD1306_SETSTARTLINE | 0x0)            # line #0
-		self.command(SSD1306_CHARGEPUMP)                    # 0x8D
-		if self._vccstate == SSD1306_EXTERNALVCC:
-			self.command(0x10)
-		else:
-			self.command(0x14)
-		self.command(SSD1306_MEMORYMODE)                    # 0x20
-		self.command(0x00)                            # 0x0 act like ks0108        
-		self.command(SSD1306_SEGREMAP | 0x1)
-		self.command(SSD1306_COMSCANDEC)
-		self.command(SSD1306_SETCOMPINS)                    # 0xDA
-		self.command(0x12)
-		self.command(SSD1306_SETCONTRAST)                   # 0x81
-		if self._vccstate == SSD1306_EXTERNALVCC:
-			self.command(0x9F)
-		else:
-			self.command(0xCF)
-		self.command(SSD1306_SETPRECHARGE)                  # 0xd9
-		if self._vccstate == SSD1306_EXTERNALVCC:
-			self.command(0x22)
-		else:
-			self.command(0xF1)
-		self.command(SSD1306_SETVCOMDETECT)                 # 0xDB
-		self.command(0x40)
-		self.command(SSD1306_DISPLAYALLON_RESUME)           # 0xA4
-		self.command(SSD1306_NORMALDISPLAY)                 # 0xA6
-		self.command(SSD1306_DISPLAYON)
+		self.resync()
+		external = self._vccstate == SSD1306_EXTERNALVCC
+		self.commands(
+			SSD1306_DISPLAYOFF,                                 # 0xAE
+			SSD1306_SETDISPLAYCLOCKDIV, 0x80,                   # 0xD5, the suggested ratio 0x80
+			SSD1306_SETMULTIPLEX, 0x3F,                         # 0xA8
+			SSD1306_SETDISPLAYOFFSET, 0x0,                      # 0xD3, no offset
+			SSD1306_SETSTARTLINE | 0x0,                         # line #0
+			SSD1306_CHARGEPUMP, 0x10 if external else 0x14,     # 0x8D
+			SSD1306_MEMORYMODE, 0x00,                           # 0x20, 0x0 act like ks0108
+			SSD1306_SEGREMAP | 0x1,
+			SSD1306_COMSCANDEC,
+			SSD1306_SETCOMPINS, 0x12,                           # 0xDA
+			SSD1306_SETCONTRAST, 0x9F if external else 0xCF,    # 0x81
+			SSD1306_SETPRECHARGE, 0x22 if external else 0xF1,   # 0xd9
+			SSD1306_SETVCOMDETECT, 0x40,                        # 0xDB
+			SSD1306_DISPLAYALLON_RESUME,                        # 0xA4
+			SSD1306_NORMALDISPLAY,                              # 0xA6
+			SSD1306_DISPLAYON)
+		self.dimmed = False
+		self.asleep = False
 	def reset(self):
 		"""Reset the display"""
 		GPIO.output(self._rst,GPIO.HIGH)
@@ -110,16 +173,81 @@ class SSD1306(object):
 		time.sleep(0.010)
 		GPIO.output(self._rst,GPIO.HIGH)
 	def display(self):
-		"""Write display buffer to physical display"""
-		self.command(SSD1306_COLUMNADDR)
-		self.command(0)                  #Cloumn start address
-		self.command(self.width-1)     #Cloumn end address
-		self.command(SSD1306_PAGEADDR)
-		self.command(0)					 #Page start address
-		self.command(self._pages-1)		 #Page end address
-		#Write buffer data
-		GPIO.output(self._dc,GPIO.HIGH)
-		self._spi.writebytes(self._buffer)
+		"""Write display buffer to physical display.
+		With partial_refresh enabled only the windows that differ from the
+		last transmitted frame are sent."""
+		if not self.partial_refresh or self._shadow is None:
+			windows = [(0, self.width-1, 0, self._pages-1)]
+		else:
+			windows = self._dirty_windows()
+		scrolling = self.scrolling
+		if scrolling is not None and windows:
+			# The RAM can't be written while it scrolls: stop, write, restart
+			self.stop_scroll()
+			if self.partial_refresh and self._shadow is not None:
+				windows = self._dirty_windows()
+		sent = 0
+		for col_start, col_end, page_start, page_end in windows:
+			sent += self._send_window(col_start, col_end, page_start, page_end)
+		self._shadow = bytearray(self._buffer)
+		self.frame_bytes_sent = sent
+		self.frame_bytes_skipped = len(self._buffer) - sent
+		if scrolling is not None and self.scrolling is None:
+			self.start_scroll(*scrolling)
+	def resync(self):
+		"""Forget the shadow buffer so the next display() sends a full frame"""
+		self._shadow = None
+	def _dirty_spans(self):
+		"""Return a list of (page, first column, last column) that changed"""
+		spans = []
+		width = self.width
+		buf = self._buffer
+		shadow = self._shadow
+		for page in range(self._pages):
+			start = page*width
+			end = start + width
+			if buf[start:end] == shadow[start:end]:
+				continue
+			first = start
+			while buf[first] == shadow[first]:
+				first += 1
+			last = end - 1
+			while buf[last] == shadow[last]:
+				last -= 1
+			spans.append((page, first-start, last-start))
+		return spans
+	def _dirty_windows(self):
+		"""Group changed spans into (col start, col end, page start, page end)
+		windows, merging neighbouring pages when that sends fewer bytes than
+		addressing them one by one."""
+		# Bytes of addressing commands needed to open one window
+		overhead = 6
+		windows = []
+		for page, first, last in self._dirty_spans():
+			if windows:
+				col_start, col_end, page_start, page_end = windows[-1]
+				if page_end == page-1:
+					merged_start = min(col_start, first)
+					merged_end = max(col_end, last)
+					merged = (merged_end-merged_start+1) * (page-page_start+1)
+					separate = (col_end-col_start+1) * (page_end-page_start+1) + (last-first+1) + overhead
+					if merged <= separate:
+						windows[-1] = (merged_start, merged_end, page_start, page)
+						continue
+			windows.append((first, last, page, page))
+		return windows
+	def _send_window(self, col_start, col_end, page_start, page_end):
+		"""Address a window of the display RAM and write its buffer bytes"""
+		self.commands(SSD1306_COLUMNADDR, col_start, col_end,
+			SSD1306_PAGEADDR, page_start, page_end)
+		if col_start == 0 and col_end == self.width-1:
+			data = self._buffer[page_start*self.width:(page_end+1)*self.width]
+		else:
+			data = bytearray()
+			for page in range(page_start, page_end+1):
+				data += self._buffer[page*self.width+col_start:page*self.width+col_end+1]
+		self.data(data)
+		return len(data)
 	def image(self, image):
 		"""Set buffer to value of Python Imaging Library image."""
 		if image.mode != '1':
@@ -129,31 +257,83 @@ class SSD1306(object):
 			raise ValueError('Image must be same dimensions as display \
 				({0}x{1}).' .format(self.width, self.height))
 
-		pix = image.load()
-		# Iterate through the memory pages
-		index = 0
-		for page in range(self._pages):
-			# Iterate through all x axis columns.
-			for x in range(self.width):
-			# Set the bits for the column of pixels at the current position.
-				bits = 0
-				# Don't use range here as it's a bit slow
-				for bit in [0, 1, 2, 3, 4, 5, 6, 7]:
-					bits = bits << 1
-					bits |= 0 if pix[(x, page*8+7-bit)] == 0 else 1
-				# Update buffer byte and increment to next byte.
-				self._buffer[index] = bits
-				index += 1
+		# Pack the whole frame with bulk operations, see pack_buffer()
+		self._buffer = pack_buffer(image.tobytes(), self.width, self._pages)
+	def image_rows(self, image, y0, y1):
+		"""Repack only the pages covering rows y0 to y1 (exclusive) of a
+		PIL image, e.g. the fields of a screen that were redrawn. The rest
+		of the buffer is kept as it is."""
+		if image.mode != '1' or image.size != (self.width, self.height):
+			raise ValueError('Image must be in mode 1 and {0}x{1}.'.format(self.width, self.height))
+		page_start = max(y0, 0) // 8
+		page_end = min((y1 + 7) // 8, self._pages)
+		if page_start >= page_end:
+			return
+		raw = image.crop((0, page_start*8, self.width, page_end*8)).tobytes()
+		# A new buffer: the old one may be a cached frame from set_buffer()
+		buf = bytearray(self._buffer)
+		buf[page_start*self.width:page_end*self.width] = pack_buffer(raw, self.width, page_end-page_start)
+		self._buffer = buf
+	def get_buffer(self):
+		"""Return a copy of the packed display buffer"""
+		return bytes(self._buffer)
+	def set_buffer(self, buf):
+		"""Set buffer to an already packed frame, e.g. one cached from
+		pack_buffer(), skipping the image conversion."""
+		if len(buf) != self.width*self._pages:
+			raise ValueError('Buffer must be {0} bytes.'.format(self.width*self._pages))
+		self._buffer = buf
+	def start_scroll(self, page_start=0, page_end=7, left=True, frames=5):
+		"""Scroll pages page_start to page_end horizontally in the controller,
+		one column every frames frames (2, 3, 4, 5, 25, 64, 128 or 256),
+		wrapping around at the panel edge. Costs no SPI traffic while it runs.
+		A display() that changes anything restarts the scroll from the
+		unscrolled buffer."""
+		if frames not in SCROLL_INTERVALS:
+			raise ValueError('frames must be one of {0}.'.format(sorted(SCROLL_INTERVALS)))
+		if not 0 <= page_start <= page_end < self._pages:
+			raise ValueError('Pages must be from 0 to {0}.'.format(self._pages-1))
+		if self.scrolling is not None:
+			self.stop_scroll()
+		self.commands(
+			SSD1306_LEFT_HORIZONTAL_SCROLL if left else SSD1306_RIGHT_HORIZONTAL_SCROLL,
+			0x00, page_start, SCROLL_INTERVALS[frames], page_end, 0x00, 0xFF,
+			SSD1306_ACTIVATE_SCROLL)
+		self.scrolling = (page_start, page_end, left, frames)
+	def stop_scroll(self):
+		"""Stop a hardware scroll. The scrolled pages are left wherever they
+		were in RAM, so they are sent again on the next display()."""
+		if self.scrolling is None:
+			return
+		page_start, page_end = self.scrolling[:2]
+		self.command(SSD1306_DEACTIVATE_SCROLL)
+		self.scrolling = None
+		if self._shadow is not None:
+			#Make the shadow differ from every byte of the scrolled pages
+			for i in range(page_start*self.width, (page_end+1)*self.width):
+				self._shadow[i] = self._buffer[i] ^ 0xFF
+	def scroll_pages(self, page_start, page_end, columns):
+		"""Software scroll: rotate pages page_start to page_end of the buffer
+		by columns (positive to the left), like one hardware scroll step.
+		The next display() only sends the pages that moved."""
+		columns %= self.width
+		if not columns:
+			return
+		buf = bytearray(self._buffer)
+		for page in range(page_start, page_end+1):
+			start = page*self.width
+			row = buf[start:start+self.width]
+			buf[start:start+self.width] = row[columns:] + row[:columns]
+		self._buffer = buf
 	def clear(self):
 		"""Clear contents of image buffer"""
-		self._buffer = [0]*(self.width*self._pages)
+		self._buffer = bytearray(self.width*self._pages)
 	def set_contrast(self, contrast):
 		"""Sets the contrast of the display.
 		Contrast should be a value between 0 and 255."""
 		if contrast < 0 or contrast > 255:
 			raise ValueError('Contrast must be a value from 0 to 255).')
-		self.command(SSD1306_SETCONTRAST)
-		self.command(contrast)
+		self.commands(SSD1306_SETCONTRAST, contrast)
 
 	def dim(self, dim):
 		"""Adjusts contrast to dim the display if dim is True, 
@@ -166,7 +346,16 @@ class SSD1306(object):
 				contrast = 0x9F
 			else:
 				contrast = 0xCF
-
-
-
-
+		self.set_contrast(contrast)
+		self.dimmed = dim
+	def sleep(self):
+		"""Turn the panel off (SSD1306_DISPLAYOFF). The display RAM keeps
+		its contents, and the controller draws almost no current."""
+		if not self.asleep:
+			self.command(SSD1306_DISPLAYOFF)
+			self.asleep = True
+	def wake(self):
+		"""Turn the panel back on, showing what it showed before sleep()"""
+		if self.asleep:
+			self.command(SSD1306_DISPLAYON)
+			self.asleep = False
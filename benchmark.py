@@ -0,0 +1,345 @@
+"""
+Benchmarks of the render-and-transfer pipeline on the simulated hardware.
+
+    python3 benchmark.py [--frames 300] [--output results.json] [--compare baseline.json]
+
+Every frame of a workload goes through four timed stages: metric collection,
+drawing the screen (template update), SSD1306.image() packing and
+SSD1306.display() transfer. Workloads that alternate kinds of frame (home and
+QR code, say) time each kind as its own series, so a percentile never falls
+on the boundary between them. The JSON report has per-series, per-stage
+p50/p99 latency in milliseconds, frames per second, bus bytes per frame and
+two memory figures per frame: the net change in allocated Python memory
+blocks and the peak traced bytes. Neither is an allocation count, memory
+allocated and freed within a frame only shows in the peak. Save one report
+per commit and pass the old one to --compare to catch regressions.
+"""
+import os
+# The benchmarks always run against the simulated Pioneer600
+os.environ['PIDASHBOARD_HAL'] = 'sim'
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import hal
+import SSD1306
+from INA219 import INA219, INA219Sampler
+from collectors import CollectorRegistry, CPUTempReader, get_ram_info, get_disk_usage
+from collectors import get_network_info
+from layouts import homeScreen, networkScreen, upsScreen, roomScreen, surveillanceScreen
+from layouts import qr_frame, qrCache, sparkline_points, CPU_SPARKLINE_BOX, POWER_SPARKLINE_BOX
+
+
+STAGES = ('collect', 'draw', 'pack', 'transfer')
+
+
+def percentile(values, q):
+    """
+    Returns:
+        float: Nearest-rank q-th percentile of values.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Pipeline:
+    """
+    The dashboard's frame path wired to the simulated board.
+    """
+
+    def __init__(self):
+        self.disp = SSD1306.SSD1306(19, 16, hal.SpiDev(0, 0))
+        self.disp.begin()
+        self.ups = INA219Sampler(INA219(addr=0x42))
+        self.metrics = CollectorRegistry()
+        self.metrics.register('cpu_temp', CPUTempReader().read, 2)
+        self.metrics.register('ram', get_ram_info, 5)
+        self.metrics.register('disk', lambda: get_disk_usage("/"), 60)
+        self.metrics.register('network', get_network_info, 5)
+        self.metrics.register('ups', self._sample_ups, 2)
+        self.shown = None
+        self.cpu_series = [40 + i % 7 for i in range(30)]
+        self.power_series = [0.9 + (i % 5) / 10 for i in range(40)]
+
+    def _sample_ups(self):
+        # No sampler thread here, take the reading in the collection stage
+        self.ups.sample()
+        return self.ups.average()
+
+    def collect(self):
+        for name in ('cpu_temp', 'ram', 'disk', 'network', 'ups'):
+            self.metrics.invalidate(name)
+        self.metrics.refresh()
+
+    def home_values(self, now):
+        used_ram, total_ram = self.metrics.value('ram', (0, 0))
+        free_space_gb, total_capacity_gb = self.metrics.value('disk', (0, 0))
+        ups = self.metrics.value('ups', {'current': 0, 'power': 0, 'percent': 0})
+        return {
+            'datetime': now.strftime("%a | %b %d %Y | %H:%M"),
+            'cpu_temp': str(self.metrics.value('cpu_temp')) + " ºC",
+            'cpu_sparkline': sparkline_points(self.cpu_series, CPU_SPARKLINE_BOX),
+            'ram': f"{used_ram:.0f} of {total_ram:.0f} MB Used",
+            'disk': f"{free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free",
+            'power': " Charging at {:1.4f} A".format(ups['current']/1000),
+            'battery': "{:1.1f}%".format(ups['percent']),
+        }
+
+    def detail_values(self, screen):
+        if screen is networkScreen:
+            network = self.metrics.value('network', {'interface_name': None, 'internal_ip': None})
+            return {'interface_name': network['interface_name'], 'internal_ip': network['internal_ip'],
+                    'user': 'pi', 'external_ip': '203.0.113.7'}
+        if screen is upsScreen:
+            ups = self.metrics.value('ups')
+            return {'bus_voltage': "{:1.2f} V".format(ups['bus_voltage']),
+                    'current': "{:1.4f} A".format(ups['current']/1000),
+                    'power': "{:1.3f} W".format(ups['power']),
+                    'power_sparkline': sparkline_points(self.power_series, POWER_SPARKLINE_BOX),
+                    'percent': "{:1.1f}%".format(ups['percent'])}
+        if screen is roomScreen:
+            return {'temperature': "24 ºС", 'humidity': "36%", 'pressure': "1 hPa", 'co2': "37%"}
+        free_space_gb, total_capacity_gb = self.metrics.value('disk', (0, 0))
+        return {'disk': f"{free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free"}
+
+
+def run_frame(pipeline, frame, timings):
+    """
+    Runs one frame. frame() is called after collection and returns either
+    ('template', screen, values) or ('buffer', screen name, function returning
+    a packed frame). timings, if given, is the {stage: [seconds]} of the
+    frame's series.
+    """
+    start = time.perf_counter()
+    pipeline.collect()
+    collected = time.perf_counter()
+    job = frame()
+    if job[0] == 'template':
+        _, screen, values = job
+        redrawn = screen.update(values)
+        rows = screen.take_dirty_rows()
+        changed = redrawn or pipeline.shown is not screen
+        drawn = time.perf_counter()
+        if changed and pipeline.shown is screen and rows is not None:
+            # Like the dashboard: only the pages of the redrawn fields
+            pipeline.disp.image_rows(screen.image, *rows)
+        elif changed:
+            pipeline.disp.image(screen.image)
+        packed = time.perf_counter()
+        if changed:
+            pipeline.disp.display()
+    else:
+        _, screen, build = job
+        buffer = build()
+        drawn = time.perf_counter()
+        changed = pipeline.shown is not screen
+        if changed:
+            pipeline.disp.set_buffer(buffer)
+        packed = time.perf_counter()
+        if changed:
+            pipeline.disp.display()
+    pipeline.shown = screen
+    done = time.perf_counter()
+    if timings is not None:
+        timings['collect'].append(collected - start)
+        timings['draw'].append(drawn - collected)
+        timings['pack'].append(packed - drawn)
+        timings['transfer'].append(done - packed)
+        timings['frame'].append(done - start)
+
+
+def workloads(pipeline):
+    """
+    Returns:
+        dict: name -> function(frame number) returning (series, frame job).
+    """
+    base = datetime(2024, 4, 1, 12, 0)
+    qr_url = "ssh://pi@192.168.1.50"
+
+    def home():
+        return 'home', lambda: ('template', homeScreen, pipeline.home_values(base))
+
+    def static_home(i):
+        return home()
+
+    def clock_tick(i):
+        return 'home', lambda: ('template', homeScreen, pipeline.home_values(base + timedelta(minutes=i)))
+
+    details = [networkScreen, upsScreen, roomScreen, surveillanceScreen]
+
+    def screen_switch(i):
+        if i % 2 == 0:
+            return home()
+        screen = details[i // 2 % len(details)]
+        return 'detail', lambda: ('template', screen, pipeline.detail_values(screen))
+
+    def qr(i):
+        # Alternates with the home screen so every QR frame is really sent
+        if i % 2 == 0:
+            return home()
+        return 'qr', lambda: ('buffer', 'qr', lambda: qr_frame(qr_url))
+
+    def qr_cold(i):
+        if i % 2 == 0:
+            return home()
+        def build():
+            qrCache.clear()
+            return qr_frame(qr_url)
+        return 'qr', lambda: ('buffer', 'qr', build)
+
+    return {'static_home': static_home, 'clock_tick': clock_tick,
+            'screen_switch': screen_switch, 'qr': qr, 'qr_cold': qr_cold}
+
+
+def bus_bytes():
+    stats = hal.board.stats()
+    spi = stats['ssd1306']['bytes_written']
+    i2c = sum(stats[d]['bytes_written'] + stats[d]['bytes_read'] for d in ('ina219', 'pcf8574'))
+    return spi, i2c
+
+
+def benchmark(pipeline, workload, frames, warmup):
+    """
+    Returns:
+        dict: Results of one workload.
+    """
+    for i in range(warmup):
+        run_frame(pipeline, workload(i)[1], None)
+
+    series = {}
+    spi_start, i2c_start = bus_bytes()
+    for i in range(frames):
+        name, job = workload(warmup + i)
+        timings = series.setdefault(name, {stage: [] for stage in STAGES + ('frame',)})
+        run_frame(pipeline, job, timings)
+    spi_end, i2c_end = bus_bytes()
+
+    # Memory is measured in a separate pass, tracing slows everything down
+    tracemalloc.start()
+    retained = 0
+    peak = 0
+    for i in range(frames):
+        _, job = workload(warmup + frames + i)
+        tracemalloc.reset_peak()
+        before = sys.getallocatedblocks()
+        base, _ = tracemalloc.get_traced_memory()
+        run_frame(pipeline, job, None)
+        # Net change, negative when the frame freed more than it kept
+        retained += sys.getallocatedblocks() - before
+        peak += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    total = sum(sum(timings['frame']) for timings in series.values())
+    return {
+        'frames': frames,
+        'fps': round(frames / total, 1) if total else None,
+        'series': {name: {'frames': len(timings['frame']),
+                          'stages': {stage: {'p50_ms': round(percentile(timings[stage], 50) * 1000, 4),
+                                             'p99_ms': round(percentile(timings[stage], 99) * 1000, 4)}
+                                     for stage in STAGES + ('frame',)}}
+                   for name, timings in series.items()},
+        'bus_bytes_per_frame': {'spi': round((spi_end - spi_start) / frames, 1),
+                                'i2c': round((i2c_end - i2c_start) / frames, 1)},
+        'memory_per_frame': {'retained_blocks': round(retained / frames, 1),
+                             'peak_bytes': round(peak / frames)},
+    }
+
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def compare(old, new, threshold):
+    """
+    Prints new against old and lists the regressions.
+
+    Returns:
+        list: (workload, metric, old, new) of everything that got worse by more
+              than threshold (a fraction).
+    """
+    regressions = []
+    for name, result in new['workloads'].items():
+        previous = old.get('workloads', {}).get(name)
+        if previous is None:
+            continue
+        rows = []
+        # Series are only compared with the same series of the old report
+        for series, timed in result['series'].items():
+            before = previous.get('series', {}).get(series)
+            if before is not None:
+                rows += [(f'{series} {stage} p50_ms', before['stages'][stage]['p50_ms'],
+                          timed['stages'][stage]['p50_ms'])
+                         for stage in STAGES + ('frame',)]
+        rows += [(f'{bus} bytes/frame', previous['bus_bytes_per_frame'][bus], result['bus_bytes_per_frame'][bus])
+                 for bus in ('spi', 'i2c')]
+        if 'memory_per_frame' in previous:
+            rows.append(('retained blocks/frame', previous['memory_per_frame']['retained_blocks'],
+                         result['memory_per_frame']['retained_blocks']))
+        print(name, file=sys.stderr)
+        for metric, before, after in rows:
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            # Ignore jitter below 50 us and below one byte or block
+            floor = 0.05 if metric.endswith('_ms') else 1
+            if change > threshold and after - before > floor:
+                flag = '  REGRESSION'
+                regressions.append((name, metric, before, after))
+            print(f"  {metric:<28} {before:>10} -> {after:<10} {change:+.0%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300, help='timed frames per workload')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed frames before each workload')
+    parser.add_argument('--workload', action='append', help='run only this workload (repeatable)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as a regression (default 0.2)')
+    args = parser.parse_args()
+
+    pipeline = Pipeline()
+    results = {}
+    for name, workload in workloads(pipeline).items():
+        if args.workload and name not in args.workload:
+            continue
+        hal.board.reset_stats()
+        results[name] = benchmark(pipeline, workload, args.frames, args.warmup)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': SSD1306.load_numpy() is not None,
+        'workloads': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
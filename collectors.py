@@ -0,0 +1,471 @@
+import glob
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+import netifaces as ni  # Install with: pip install netifaces
+
+
+# Service returning the external IP address as plain text
+EXTERNAL_IP_URL = "https://api.ipify.org?format=text"
+
+# Latest cached value of a metric, when it was collected and whether it is too old to trust
+Reading = namedtuple('Reading', ['value', 'timestamp', 'stale'])
+
+
+class Collector:
+    """
+    One metric: the function that produces it, how often it is refreshed and
+    the last value it returned.
+    """
+
+    def __init__(self, name, func, interval, ttl=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        # A value older than ttl seconds is reported as stale
+        self.ttl = ttl if ttl is not None else 3 * interval
+        # As registered, see CollectorRegistry.scale_intervals()
+        self.base_interval = self.interval
+        self.base_ttl = self.ttl
+        self.value = None
+        self.timestamp = None
+        self.errors = 0
+        self.next_due = 0
+
+
+class CollectorRegistry:
+    """
+    Registry of metric collectors with independent refresh intervals.
+
+    The main loop calls refresh() whenever next_due() has passed, and screens
+    read the cached values with get() or value() without touching the
+    hardware or the network.
+    """
+
+    def __init__(self, clock=time.monotonic, stats=None):
+        self._clock = clock
+        # Optional Instrumentation timing every collector as 'collect.<name>'
+        self.stats = stats
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, func, interval, ttl=None):
+        """
+        Adds a collector that is due right away.
+
+        Args:
+            name: Key the value is stored under.
+            func: Callable returning the new value, None means the read failed.
+                  Pass None for metrics a background worker publish()es.
+            interval: Seconds between refreshes (expected publish period if func is None).
+            ttl: Seconds after which the value counts as stale (default 3 intervals).
+        """
+        collector = Collector(name, func, interval, ttl)
+        if func is None:
+            collector.next_due = float('inf')
+        self._collectors[name] = collector
+
+    def publish(self, name, value):
+        """
+        Stores a value produced outside refresh(), e.g. by a background
+        worker. Safe to call from other threads.
+        """
+        collector = self._collectors[name]
+        with self._lock:
+            collector.value = value
+            collector.timestamp = self._clock()
+
+    def restore(self, values, age):
+        """
+        Seeds the metrics that have no value yet with values saved age
+        seconds ago, e.g. by the last run. They are replaced on their next
+        refresh and count as stale once older than their ttl.
+        """
+        now = self._clock()
+        with self._lock:
+            for name, value in values.items():
+                collector = self._collectors.get(name)
+                if collector is not None and collector.value is None:
+                    collector.value = value
+                    collector.timestamp = now - age
+
+    def invalidate(self, name):
+        """
+        Makes a collector due on the next refresh(), e.g. after an interface change.
+        """
+        collector = self._collectors[name]
+        if collector.func is not None:
+            collector.next_due = 0
+
+    def scale_intervals(self, factor):
+        """
+        Sets every refresh interval and ttl to factor times the registered
+        one, e.g. to poll less often on battery.
+        """
+        for collector in self._collectors.values():
+            collector.interval = collector.base_interval * factor
+            collector.ttl = collector.base_ttl * factor
+            if collector.func is not None and collector.timestamp is not None:
+                collector.next_due = collector.timestamp + collector.interval
+
+    def next_due(self):
+        """
+        Returns:
+            float: Monotonic time at which the next collector is due.
+        """
+        return min(c.next_due for c in self._collectors.values())
+
+    def refresh(self):
+        """
+        Runs every collector whose interval has elapsed.
+
+        Returns:
+            set: Names of the metrics whose value changed.
+        """
+        changed = set()
+        now = self._clock()
+        for collector in self._collectors.values():
+            if now >= collector.next_due and self._refresh(collector, now):
+                changed.add(collector.name)
+        return changed
+
+    def _refresh(self, collector, now):
+        collector.next_due = now + collector.interval
+        started = time.perf_counter()
+        try:
+            value = collector.func()
+        except Exception as e:
+            print(f"Error collecting {collector.name}: {e}")
+            value = None
+        if self.stats is not None:
+            self.stats.record('collect.' + collector.name, time.perf_counter() - started)
+        if value is None:
+            # Keep serving the last good value, it turns stale on its own
+            collector.errors += 1
+            return False
+        with self._lock:
+            changed = value != collector.value
+            collector.value = value
+            collector.timestamp = self._clock()
+        return changed
+
+    def get(self, name):
+        """
+        Returns:
+            Reading: Cached value with its timestamp and staleness flag.
+        """
+        collector = self._collectors[name]
+        with self._lock:
+            value, timestamp = collector.value, collector.timestamp
+        stale = timestamp is None or self._clock() - timestamp > collector.ttl
+        return Reading(value, timestamp, stale)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: name -> (Reading, age in seconds or None) of every metric,
+                  read together under one lock.
+        """
+        snapshot = {}
+        with self._lock:
+            now = self._clock()
+            for name, collector in self._collectors.items():
+                age = None if collector.timestamp is None else now - collector.timestamp
+                stale = age is None or age > collector.ttl
+                snapshot[name] = (Reading(collector.value, collector.timestamp, stale), age)
+        return snapshot
+
+    def value(self, name, default=None):
+        """
+        Returns:
+            The cached value of a metric, or default if it was never collected.
+        """
+        value = self.get(name).value
+        return default if value is None else value
+
+
+#Configuring CPU Readings:
+def get_cpu_temp():
+    """
+    Retrieves CPU temperature from Raspberry Pi using vcgencmd command.
+
+    Returns:
+        float: CPU temperature in degrees Celsius, or None if an error occurs.
+    """
+    try:
+        # Execute the vcgencmd command to get temperature
+        output = subprocess.run(["vcgencmd", "measure_temp"], capture_output=True, text=True, check=True)
+        # Extract the temperature value from the output
+        match = re.search(r"temp=(\d+\.?\d*)", output.stdout)
+        if match:
+            return float(match.group(1))
+        else:
+            return None
+    except (subprocess.CalledProcessError, OSError):
+        # Error occurred during command execution, or vcgencmd is not installed
+        return None
+
+
+class CPUTempReader:
+    """
+    Reads CPU temperature straight from the kernel thermal zones.
+
+    The zone temp files are opened once and re-read with pread, so a sample
+    costs one small read instead of forking vcgencmd. Falls back to
+    get_cpu_temp() when the sysfs tree has no thermal zones.
+    """
+
+    def __init__(self, sysfs_root='/sys/class/thermal'):
+        self.sysfs_root = sysfs_root
+        # (zone directory, zone type, open fd or None)
+        self.zones = []
+        for path in sorted(glob.glob(os.path.join(sysfs_root, 'thermal_zone*'))):
+            try:
+                with open(os.path.join(path, 'type')) as f:
+                    zone_type = f.read().strip()
+            except OSError:
+                zone_type = os.path.basename(path)
+            self.zones.append([path, zone_type, None])
+        # The SoC zone is called cpu-thermal on current kernels, cpu_thermal on older ones
+        self.primary = 0
+        for index, zone in enumerate(self.zones):
+            if zone[1] in ('cpu-thermal', 'cpu_thermal'):
+                self.primary = index
+                break
+
+    def _read_zone(self, zone):
+        """
+        Returns:
+            float: Temperature of one zone in degrees Celsius, or None.
+        """
+        for attempt in range(2):
+            try:
+                if zone[2] is None:
+                    zone[2] = os.open(os.path.join(zone[0], 'temp'), os.O_RDONLY)
+                return round(int(os.pread(zone[2], 16, 0)) / 1000, 1)
+            except (OSError, ValueError):
+                # Reopen once, the zone may have been re-created
+                self._close_zone(zone)
+        return None
+
+    def _close_zone(self, zone):
+        if zone[2] is not None:
+            try:
+                os.close(zone[2])
+            except OSError:
+                pass
+            zone[2] = None
+
+    def read(self):
+        """
+        Returns:
+            float: CPU temperature in degrees Celsius, or None if an error occurs.
+        """
+        if not self.zones:
+            return get_cpu_temp()
+        return self._read_zone(self.zones[self.primary])
+
+    def read_all(self):
+        """
+        Returns:
+            dict: Temperature in degrees Celsius of every thermal zone, keyed by zone type.
+        """
+        return {zone[1]: self._read_zone(zone) for zone in self.zones}
+
+    def close(self):
+        for zone in self.zones:
+            self._close_zone(zone)
+
+
+#Configuring Memory Readings:
+def get_ram_info():
+    """
+    Retrieves information about used RAM and total RAM capacity.
+
+    Returns:
+        tuple: (used_ram, total_ram), both in MB.
+    """
+    # Imported on first use, it's not needed for the first frame
+    import psutil
+    # Get memory usage statistics
+    mem = psutil.virtual_memory()
+    # Convert values from bytes to Megabytes (MB)
+    used_ram = mem.used / (1024 * 1024)
+    total_ram = mem.total / (1024 * 1024)
+    #free_ram = mem.free / (1024 * 1024)
+    return used_ram, total_ram
+
+
+#Getting Disk Space Info:
+def get_disk_usage(path):
+    """
+    Gets the free space and total capacity of the disk containing the specified path.
+
+    Args:
+        path: A path on the system disk.
+
+    Returns:
+        tuple: (free_space_gb, total_capacity_gb), both in GB, or None if an error occurs.
+    """
+    try:
+        # Get disk usage statistics using os.statvfs
+        stat = os.statvfs(path)
+        # Calculate free space and total capacity in Gigabytes
+        free_space_gb = stat.f_bavail * stat.f_frsize / (1024 * 1024 * 1024)
+        total_capacity_gb = stat.f_blocks * stat.f_frsize / (1024 * 1024 * 1024)
+        return free_space_gb, total_capacity_gb
+    except OSError as e:
+        print(f"Error getting disk usage: {e}")
+        return None
+
+
+#Getting Network Stats:
+def get_network_signature(sys_net='/sys/class/net'):
+    """
+    Cheap summary of the network interfaces and their link state, used to
+    notice interface changes without enumerating addresses.
+
+    Returns:
+        tuple: (interface, operstate) pairs.
+    """
+    signature = []
+    try:
+        for interface in sorted(os.listdir(sys_net)):
+            try:
+                with open(os.path.join(sys_net, interface, 'operstate')) as f:
+                    signature.append((interface, f.read().strip()))
+            except OSError:
+                signature.append((interface, None))
+    except OSError:
+        pass
+    return tuple(signature)
+
+
+def get_network_info():
+    """
+    Gets information about the active network interface and its IP address.
+
+    Returns:
+        dict: A dictionary containing keys:
+            - interface_name (str): Name of the active interface (e.g., wlan0, eth0).
+            - internal_ip (str): Internal IP address on the active interface.
+    """
+    # Get list of available interfaces
+    interfaces = ni.interfaces()
+    # Find the active interface (connected and not loopback)
+    active_interface = None
+    for interface in interfaces:
+        # Interfaces without an IPv4 address have no AF_INET entry at all
+        if interface != 'lo' and ni.ifaddresses(interface).get(ni.AF_INET):
+            active_interface = interface
+            break
+
+    if not active_interface:
+        return {'interface_name': None, 'internal_ip': None}
+
+    # Get internal IP address
+    internal_ip = ni.ifaddresses(active_interface)[ni.AF_INET][0]['addr']
+
+    return {
+        'interface_name': active_interface,
+        'internal_ip': internal_ip,
+    }
+
+
+class ExternalIPResolver:
+    """
+    Looks up the external IP address in a background thread so a slow or
+    missing uplink never blocks the dashboard. The last known address is
+    served instantly through get() and handed to on_update.
+    """
+
+    def __init__(self, url=EXTERNAL_IP_URL, interval=15*60, timeout=(3.05, 5),
+                 min_backoff=5, max_backoff=10*60, on_update=None, stats=None):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_update = on_update
+        # Optional Instrumentation timing every lookup as 'net.external_ip'
+        self.stats = stats
+        self.errors = 0
+        self._value = None
+        # Created in the resolver thread, importing requests is slow
+        self._session = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the resolver thread, the first lookup happens right away.
+        """
+        self._thread = threading.Thread(target=self._run, name='external-ip', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._session is not None:
+            self._session.close()
+
+    def refresh_now(self):
+        """
+        Asks for a new lookup, e.g. after the active interface changed.
+        """
+        self._wakeup.set()
+
+    def get(self):
+        """
+        Returns:
+            str: Last known external IP address, or None if never resolved.
+        """
+        return self._value
+
+    def fetch(self):
+        """
+        Retrieves external IP address from the configured service.
+
+        Returns:
+            str: External IP address, or None if an error occurs.
+        """
+        try:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            response = self._session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.text.strip() or None
+        except Exception as e:
+            print(f"Error getting external IP: {e}")
+            return None
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stopped.is_set():
+            # Cleared before the lookup, a refresh_now() during it is kept
+            self._wakeup.clear()
+            started = time.perf_counter()
+            value = self.fetch()
+            if self.stats is not None:
+                self.stats.record('net.external_ip', time.perf_counter() - started)
+            if value is None:
+                # Exponential backoff while the service is unreachable
+                self.errors += 1
+                delay = backoff
+                backoff = min(backoff * 2, self.max_backoff)
+            else:
+                self._value = value
+                if self.on_update is not None:
+                    self.on_update(value)
+                delay = self.interval
+                backoff = self.min_backoff
+            self._wakeup.wait(delay)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+
+# Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Gauges derived from the cached metrics: (metric, gauge name, help, function(value) -> number)
+GAUGES = [
+    ('cpu_temp', 'pidashboard_cpu_temperature_celsius', 'CPU temperature.', lambda v: v),
+    ('ram', 'pidashboard_ram_used_bytes', 'Used RAM.', lambda v: v[0] * 1024 * 1024),
+    ('ram', 'pidashboard_ram_total_bytes', 'Total RAM.', lambda v: v[1] * 1024 * 1024),
+    ('disk', 'pidashboard_disk_free_bytes', 'Free space on the root filesystem.', lambda v: v[0] * 1024**3),
+    ('disk', 'pidashboard_disk_total_bytes', 'Size of the root filesystem.', lambda v: v[1] * 1024**3),
+    ('ups', 'pidashboard_ups_bus_voltage_volts', 'UPS load voltage.', lambda v: v['bus_voltage']),
+    ('ups', 'pidashboard_ups_current_amps', 'UPS battery current, negative while discharging.',
+     lambda v: v['current'] / 1000),
+    ('ups', 'pidashboard_ups_power_watts', 'UPS power.', lambda v: v['power']),
+    ('ups', 'pidashboard_ups_battery_percent', 'UPS battery charge estimate.', lambda v: v['percent']),
+    ('bmp280', 'pidashboard_room_temperature_celsius', 'Room temperature (BMP280).', lambda v: v['temperature']),
+    ('bmp280', 'pidashboard_room_pressure_hpa', 'Air pressure (BMP280).', lambda v: v['pressure']),
+    ('dht22', 'pidashboard_room_humidity_percent', 'Relative humidity (DHT22).', lambda v: v['humidity']),
+    ('co2', 'pidashboard_room_co2_ppm', 'CO2 concentration (MH-Z19).', lambda v: v['co2']),
+    ('power_profile', 'pidashboard_on_battery', 'Whether the battery operating profile is active.',
+     lambda v: int(v['profile'] == 'battery')),
+]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot):
+    """
+    Renders a CollectorRegistry.snapshot() in the Prometheus text format.
+
+    Returns:
+        str: Exposition text.
+    """
+    lines = []
+    for metric, name, help_text, convert in GAUGES:
+        reading, _ = snapshot.get(metric, (None, None))
+        if reading is None or reading.value is None:
+            continue
+        try:
+            number = convert(reading.value)
+        except (KeyError, IndexError, TypeError):
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {number}')
+
+    network, _ = snapshot.get('network', (None, None))
+    external_ip, _ = snapshot.get('external_ip', (None, None))
+    if network is not None and network.value is not None:
+        labels = [('interface', network.value.get('interface_name') or ''),
+                  ('internal_ip', network.value.get('internal_ip') or ''),
+                  ('external_ip', (external_ip.value if external_ip is not None else None) or '')]
+        lines.append('# HELP pidashboard_network_info Active network interface and addresses.')
+        lines.append('# TYPE pidashboard_network_info gauge')
+        lines.append('pidashboard_network_info{%s} 1' % ','.join(f'{k}="{_label(v)}"' for k, v in labels))
+
+    throughput, _ = snapshot.get('throughput', (None, None))
+    if throughput is not None and throughput.value:
+        for index, direction in enumerate(('receive', 'transmit')):
+            name = f'pidashboard_network_{direction}_bytes_per_second'
+            lines.append(f'# HELP {name} Network {direction} rate per interface.')
+            lines.append(f'# TYPE {name} gauge')
+            for interface, rates in sorted(throughput.value.items()):
+                lines.append(f'{name}{{interface="{_label(interface)}"}} {rates[index]:.1f}')
+
+    power_profile, _ = snapshot.get('power_profile', (None, None))
+    if power_profile is not None and power_profile.value is not None:
+        lines.append('# HELP pidashboard_profile_power_watts Average power measured by the INA219 in each operating profile.')
+        lines.append('# TYPE pidashboard_profile_power_watts gauge')
+        for profile, watts in sorted(power_profile.value['average_power'].items()):
+            lines.append(f'pidashboard_profile_power_watts{{profile="{_label(profile)}"}} {watts}')
+
+    lines.append('# HELP pidashboard_metric_age_seconds Seconds since a metric was last collected.')
+    lines.append('# TYPE pidashboard_metric_age_seconds gauge')
+    for metric, (_, age) in sorted(snapshot.items()):
+        if age is not None:
+            lines.append(f'pidashboard_metric_age_seconds{{metric="{metric}"}} {age:.3f}')
+    lines.append('# HELP pidashboard_metric_stale Whether a metric is older than its TTL.')
+    lines.append('# TYPE pidashboard_metric_stale gauge')
+    for metric, (reading, _) in sorted(snapshot.items()):
+        lines.append(f'pidashboard_metric_stale{{metric="{metric}"}} {int(reading.stale)}')
+    return '\n'.join(lines) + '\n'
+
+
+def json_document(snapshot):
+    """
+    Renders a CollectorRegistry.snapshot() as JSON.
+
+    Returns:
+        str: {"time": ..., "metrics": {name: {"value", "age", "stale"}}}
+    """
+    return json.dumps({
+        'time': time.time(),
+        'metrics': {name: {'value': reading.value,
+                           'age': None if age is None else round(age, 3),
+                           'stale': reading.stale}
+                    for name, (reading, age) in snapshot.items()},
+    })
+
+
+class MetricsServer:
+    """
+    Serves the dashboard's cached metrics to other local tools, so they
+    don't poll the INA219 or psutil themselves.
+
+    A small asyncio HTTP server in its own thread answers GET /metrics
+    (Prometheus text) and GET /metrics.json. Requests only read the
+    CollectorRegistry cache, they never touch the hardware.
+    """
+
+    def __init__(self, registry, host='127.0.0.1', port=9105, unix_path=None):
+        self.registry = registry
+        self.host = host
+        # port None serves on the Unix socket only
+        self.port = port
+        self.unix_path = unix_path
+        self.requests = 0
+        self._loop = None
+        self._servers = []
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        Raises:
+            OSError: If the port or socket path can't be bound.
+        """
+        self._thread = threading.Thread(target=self._run, name='metrics-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._listen())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for server in self._servers:
+                server.close()
+            self._loop.close()
+            if self.unix_path is not None:
+                try:
+                    os.unlink(self.unix_path)
+                except OSError:
+                    pass
+
+    async def _listen(self):
+        if self.port is not None:
+            self._servers.append(await asyncio.start_server(self._handle, self.host, self.port))
+        if self.unix_path is not None:
+            # A socket left over from an unclean exit would make the bind fail
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            self._servers.append(await asyncio.start_unix_server(self._handle, self.unix_path))
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            # Skip the headers, nothing in them matters here
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            parts = request.decode('latin-1').split()
+            method, path = (parts[0], parts[1].split('?')[0]) if len(parts) >= 2 else ('', '')
+            self.requests += 1
+            if method != 'GET':
+                status, content_type, body = '405 Method Not Allowed', 'text/plain', 'GET only\n'
+            elif path in ('/', '/metrics'):
+                status, content_type, body = '200 OK', PROMETHEUS_CONTENT_TYPE, prometheus_text(self.registry.snapshot())
+            elif path == '/metrics.json':
+                status, content_type, body = '200 OK', 'application/json', json_document(self.registry.snapshot())
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', 'Try /metrics or /metrics.json\n'
+            data = body.encode()
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,111 @@
+import string
+from collections import OrderedDict
+
+from PIL import Image
+from PIL import ImageChops
+from PIL import ImageDraw
+
+
+# Glyphs rendered up front; anything else is added on first use
+ATLAS_CHARSET = string.digits + string.ascii_letters + string.punctuation + " ºС°"
+
+
+class GlyphFont:
+    """
+    1-bit glyph atlas for one FreeType font.
+
+    Every glyph is rasterized once into a small mask together with its offset
+    and advance, so drawing text is a matter of pasting cached bitmaps. Whole
+    strings that repeat frame to frame (labels, units, unchanged values) are
+    kept in an LRU cache and cost a single paste.
+    """
+
+    def __init__(self, font, charset=ATLAS_CHARSET, cache_size=128):
+        self.font = font
+        ascent, descent = font.getmetrics()
+        self.ascent = ascent
+        self.height = ascent + descent
+        self.cache_size = cache_size
+        self._glyphs = {}
+        self._kerning = {}
+        self._strings = OrderedDict()
+        for char in charset:
+            self._glyph(char)
+
+    def _glyph(self, char):
+        """
+        Returns:
+            tuple: (mask image or None for blank glyphs, x offset, y offset, advance)
+        """
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            advance = self.font.getlength(char)
+            # FreeType places a glyph one pixel higher or lower depending on
+            # the tallest glyph in the string, so rasterize it after a full
+            # height bar and keep only the pixels the glyph adds
+            prefix = '| '
+            origin = round(self.font.getlength(prefix + char) - advance)
+            size = (origin + int(advance) + self.height, 2*self.height)
+            context = Image.new('1', size)
+            ImageDraw.Draw(context).text((0, 0), prefix, font=self.font, fill=255)
+            canvas = Image.new('1', size)
+            ImageDraw.Draw(canvas).text((0, 0), prefix + char, font=self.font, fill=255)
+            canvas = ImageChops.subtract(canvas, context)
+            box = canvas.getbbox()
+            if box is None:
+                glyph = (None, 0, 0, advance)
+            else:
+                glyph = (canvas.crop(box), box[0] - origin, box[1], advance)
+            self._glyphs[char] = glyph
+        return glyph
+
+    def _kern(self, previous, char):
+        """
+        Returns:
+            float: Kerning adjustment between two characters.
+        """
+        pair = previous + char
+        kern = self._kerning.get(pair)
+        if kern is None:
+            kern = self.font.getlength(pair) - self._glyph(previous)[3] - self._glyph(char)[3]
+            self._kerning[pair] = kern
+        return kern
+
+    def render(self, text):
+        """
+        Returns:
+            Image: Mode '1' image of text whose top row is the font's ascender
+                   line, the same origin ImageDraw.text() uses.
+        """
+        image = self._strings.get(text)
+        if image is not None:
+            self._strings.move_to_end(text)
+            return image
+        placed = []
+        cursor = 0.0
+        previous = None
+        for char in text:
+            if previous is not None:
+                cursor += self._kern(previous, char)
+            mask, x_offset, y_offset, advance = self._glyph(char)
+            if mask is not None:
+                placed.append((mask, round(cursor) + x_offset, y_offset))
+            cursor += advance
+            previous = char
+        width = max([int(cursor)] + [x + mask.width for mask, x, _ in placed]) or 1
+        height = max([self.height] + [y + mask.height for mask, _, y in placed])
+        image = Image.new('1', (width, height))
+        for mask, x, y in placed:
+            image.paste(mask, (x, y), mask)
+        self._strings[text] = image
+        if len(self._strings) > self.cache_size:
+            self._strings.popitem(last=False)
+        return image
+
+    def draw(self, image, xy, text, fill=255):
+        """
+        Draws text onto image at xy, like ImageDraw.text(xy, text, font=..., fill=fill).
+        """
+        if text:
+            mask = self.render(text)
+            image.paste(fill, (int(xy[0]), int(xy[1])), mask)
@@ -0,0 +1,37 @@
+"""
+Hardware access for the dashboard.
+
+Everything that touches SPI, I2C or GPIO imports them from here:
+
+    from hal import GPIO, SMBus, SpiDev
+
+GPIO has the RPi.GPIO module interface, SMBus and SpiDev are constructed
+like smbus2.SMBus(bus) and spidev.SpiDev(bus, device); i2c_msg builds the
+messages of combined SMBus.i2c_rdwr() transactions. Drivers share one bus
+through i2cbus.shared_bus() rather than opening SMBus themselves.
+
+The backend is picked once at import from the PIDASHBOARD_HAL environment
+variable: 'hw' (default) uses RPi.GPIO, smbus2 and spidev, 'sim' uses the
+in-process Pioneer600 simulator from simhw.py so the dashboard can run and be
+measured without a Pi. In 'sim' mode board gives access to the device models
+and their traffic counters.
+"""
+import os
+
+
+BACKEND = os.environ.get('PIDASHBOARD_HAL', 'hw')
+
+if BACKEND == 'sim':
+    import simhw
+    board = simhw.Board()
+    GPIO = board.gpio
+    SMBus = board.SMBus
+    i2c_msg = simhw.i2c_msg
+    SpiDev = board.SpiDev
+elif BACKEND == 'hw':
+    import RPi.GPIO as GPIO
+    from smbus2 import SMBus, i2c_msg
+    from spidev import SpiDev
+    board = None
+else:
+    raise ValueError(f"Unknown PIDASHBOARD_HAL backend {BACKEND!r}, use 'hw' or 'sim'")
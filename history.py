@@ -0,0 +1,189 @@
+import threading
+import time
+from array import array
+
+
+# Roll-up tiers: (bucket seconds, seconds kept)
+MINUTE_TIER = (60, 24*60*60)           # 1 minute min/max/avg for 24 hours
+QUARTER_TIER = (15*60, 7*24*60*60)     # 15 minute min/max/avg for a week
+RAW_SPAN = 10*60                       # raw samples are kept for 10 minutes
+
+
+class _Ring:
+    """
+    Fixed-capacity ring buffer of columns stored in typed arrays.
+    """
+
+    def __init__(self, capacity, typecodes):
+        self.capacity = capacity
+        self.columns = [array(code, bytes(array(code).itemsize * capacity)) for code in typecodes]
+        self.index = 0
+        self.count = 0
+
+    def push(self, *values):
+        for column, value in zip(self.columns, values):
+            column[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def newest(self):
+        """
+        Yields rows from the newest to the oldest.
+        """
+        columns = self.columns
+        index = self.index
+        for _ in range(self.count):
+            index = (index - 1) % self.capacity
+            yield tuple(column[index] for column in columns)
+
+
+class MetricHistory:
+    """
+    History of one metric: raw samples plus 1 minute and 15 minute roll-ups.
+
+    append() is O(1); older data is rolled up into coarser buckets when a
+    bucket boundary is crossed, so memory stays fixed whatever the uptime.
+    """
+
+    def __init__(self, raw_interval=5):
+        self.raw = _Ring(int(RAW_SPAN / raw_interval) + 1, 'df')
+        # Roll-up rings hold bucket start, min, max, average and sample count
+        self.tiers = [_Ring(MINUTE_TIER[1] // MINUTE_TIER[0], 'dfffI'),
+                      _Ring(QUARTER_TIER[1] // QUARTER_TIER[0], 'dfffI')]
+        self._sizes = [MINUTE_TIER[0], QUARTER_TIER[0]]
+        # Open bucket of each tier: [start, min, max, sum, count]
+        self._open = [None, None]
+
+    def append(self, value, t):
+        self.raw.push(t, value)
+        self._accumulate(0, t, value, value, value, 1)
+
+    def _accumulate(self, level, t, low, high, total, count):
+        size = self._sizes[level]
+        start = t - t % size
+        bucket = self._open[level]
+        if bucket is not None and bucket[0] != start:
+            self._close(level)
+            bucket = None
+        if bucket is None:
+            self._open[level] = [start, low, high, total, count]
+        else:
+            if low < bucket[1]:
+                bucket[1] = low
+            if high > bucket[2]:
+                bucket[2] = high
+            bucket[3] += total
+            bucket[4] += count
+
+    def _close(self, level):
+        start, low, high, total, count = self._open[level]
+        self._open[level] = None
+        self.tiers[level].push(start, low, high, total / count, count)
+        if level + 1 < len(self.tiers):
+            self._accumulate(level + 1, start, low, high, total, count)
+
+    def _buckets(self, seconds, now):
+        """
+        Yields (start, min, max, sum, count) newest first from the finest tier
+        that still covers the window. Roll-up buckets that began before the
+        window are left out whole, so a window longer than the raw span
+        starts up to one bucket late rather than early.
+        """
+        since = now - seconds
+        if seconds <= RAW_SPAN:
+            for t, value in self.raw.newest():
+                if t < since:
+                    return
+                yield t, value, value, value, 1
+            return
+        level = 0 if seconds <= MINUTE_TIER[1] else 1
+        # Open buckets hold what hasn't been rolled up into this tier yet
+        for lower in range(level, -1, -1):
+            bucket = self._open[lower]
+            if bucket is not None and bucket[0] >= since:
+                yield tuple(bucket)
+        for start, low, high, avg, count in self.tiers[level].newest():
+            if start < since:
+                return
+            # Weighted by their sample count, like the open bucket
+            yield start, low, high, avg * count, count
+
+    def stats(self, seconds, now):
+        """
+        Returns:
+            tuple: (min, max, average) over the last seconds, or None if there is no data.
+        """
+        low = high = None
+        total = count = 0
+        for _, bucket_low, bucket_high, bucket_total, bucket_count in self._buckets(seconds, now):
+            if low is None or bucket_low < low:
+                low = bucket_low
+            if high is None or bucket_high > high:
+                high = bucket_high
+            total += bucket_total
+            count += bucket_count
+        if count == 0:
+            return None
+        return low, high, total / count
+
+    def series(self, seconds, points, now):
+        """
+        Returns:
+            list: points averages covering the last seconds, oldest first,
+                  None where there is no data.
+        """
+        since = now - seconds
+        step = seconds / points
+        totals = [0.0] * points
+        counts = [0] * points
+        for start, _, _, total, count in self._buckets(seconds, now):
+            slot = min(max(int((start - since) / step), 0), points - 1)
+            totals[slot] += total
+            counts[slot] += count
+        return [totals[i] / counts[i] if counts[i] else None for i in range(points)]
+
+
+class HistoryStore:
+    """
+    Bounded in-memory history for the dashboard metrics.
+    """
+
+    def __init__(self, names, raw_interval=5, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.metrics = {name: MetricHistory(raw_interval) for name in names}
+
+    def record(self, name, value, t=None):
+        """
+        Appends a sample; None values (failed reads) are skipped.
+        """
+        if value is None:
+            return
+        with self._lock:
+            self.metrics[name].append(value, self._clock() if t is None else t)
+
+    def stats(self, name, seconds):
+        """
+        Returns:
+            tuple: (min, max, average) of a metric over the last seconds, or None.
+        """
+        with self._lock:
+            return self.metrics[name].stats(seconds, self._clock())
+
+    def average(self, name, seconds):
+        """
+        Returns:
+            float: Average of a metric over the last seconds, e.g.
+                   average('power', 5*60), or None if there is no data.
+        """
+        stats = self.stats(name, seconds)
+        return None if stats is None else stats[2]
+
+    def series(self, name, seconds, points):
+        """
+        Returns:
+            list: Averages of a metric in points equal slots over the last seconds.
+        """
+        with self._lock:
+            return self.metrics[name].series(seconds, points, self._clock())
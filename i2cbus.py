@@ -0,0 +1,216 @@
+import threading
+import time
+
+from hal import SMBus, i2c_msg
+from instrumentation import RollingHistogram
+
+
+class DeviceStats:
+    """Transaction counters and latency of one device on the bus."""
+
+    def __init__(self, name):
+        self.name = name
+        self.transactions = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.latency = RollingHistogram()
+
+    def as_dict(self):
+        p50 = self.latency.percentile(50)
+        p99 = self.latency.percentile(99)
+        return {
+            'transactions': self.transactions,
+            'errors': self.errors,
+            'bytes_written': self.bytes_written,
+            'bytes_read': self.bytes_read,
+            'p50_ms': None if p50 is None else round(p50 * 1000, 3),
+            'p99_ms': None if p99 is None else round(p99 * 1000, 3),
+            'max_ms': round(self.latency.max * 1000, 3),
+        }
+
+
+class I2CBus:
+    """
+    The one handle of an I2C bus for the whole process.
+
+    Every transaction takes the bus lock, so the UPS sampler, the key poller
+    and the sensors can share the bus from their own threads. It has the
+    SMBus methods the drivers use, plus read_registers() reading
+    several registers in one combined transaction.
+
+    Use shared_bus() instead of creating one, so every driver gets the same
+    instance and the bus is opened once.
+    """
+
+    def __init__(self, bus=1, stats=None):
+        self.number = bus
+        self._bus = SMBus(bus)
+        # Reentrant so a driver can hold the bus over several transactions
+        self.lock = threading.RLock()
+        # Optional Instrumentation timing every transaction as 'i2c.<device>'
+        self.stats = stats
+        self.names = {}
+        self._devices = {}
+
+    def name(self, address, name):
+        """
+        Names the device at address in the stats, e.g. 'ina219' instead of '0x42'.
+        """
+        self.names[address] = name
+        if address in self._devices:
+            self._devices[address].name = name
+
+    def _device(self, address):
+        device = self._devices.get(address)
+        if device is None:
+            device = self._devices.setdefault(address, DeviceStats(self.names.get(address, f'{address:#04x}')))
+        return device
+
+    def _transfer(self, address, written, read, func, *args):
+        device = self._device(address)
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                result = func(*args)
+            except OSError:
+                device.errors += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+            # Under the lock, the counters are shared by every thread using the device
+            device.transactions += 1
+            device.bytes_written += written
+            device.bytes_read += read
+            device.latency.add(elapsed)
+            if self.stats is not None:
+                self.stats.record(f'i2c.{device.name}', elapsed)
+        return result
+
+    def read_byte(self, address):
+        return self._transfer(address, 0, 1, self._bus.read_byte, address)
+
+    def write_byte(self, address, value):
+        self._transfer(address, 1, 0, self._bus.write_byte, address, value)
+
+    def read_byte_data(self, address, register):
+        return self._transfer(address, 1, 1, self._bus.read_byte_data, address, register)
+
+    def write_byte_data(self, address, register, value):
+        self._transfer(address, 2, 0, self._bus.write_byte_data, address, register, value)
+
+    def read_i2c_block_data(self, address, register, length=32):
+        return self._transfer(address, 1, length, self._bus.read_i2c_block_data, address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        self._transfer(address, 1 + len(data), 0, self._bus.write_i2c_block_data, address, register, data)
+
+    def read_registers(self, address, registers, length=2):
+        """
+        Reads several registers in one combined transaction: a register
+        pointer write and a read per register, joined by repeated starts.
+
+        Returns:
+            list: The bytes read from each register, in order.
+        """
+        messages = []
+        for register in registers:
+            messages.append(i2c_msg.write(address, [register]))
+            messages.append(i2c_msg.read(address, length))
+        self._transfer(address, len(registers), len(registers) * length, self._bus.i2c_rdwr, *messages)
+        return [list(message) for message in messages[1::2]]
+
+    def transfer(self, address, write=(), read=0):
+        """
+        Writes bytes to a device and then reads from it, in one combined
+        transaction when both are given.
+
+        Returns:
+            list: The bytes read, empty when read is 0.
+        """
+        messages = []
+        if write or not read:
+            messages.append(i2c_msg.write(address, list(write)))
+        if read:
+            messages.append(i2c_msg.read(address, read))
+        self._transfer(address, len(write), read, self._bus.i2c_rdwr, *messages)
+        return list(messages[-1]) if read else []
+
+    def device_stats(self):
+        """
+        Returns:
+            dict: Transaction and byte counts, errors and latency in
+                  milliseconds of every device, by name.
+        """
+        return {device.name: device.as_dict() for device in list(self._devices.values())}
+
+    def close(self):
+        with self.lock:
+            self._bus.close()
+
+
+class BusioI2C:
+    """
+    The busio.I2C interface on top of an I2CBus, so CircuitPython drivers
+    (e.g. adafruit_bmp280) share the process-wide bus and its lock instead
+    of opening the bus device again.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def try_lock(self):
+        # Blocks instead of making the driver spin until the bus is free
+        return self.bus.lock.acquire()
+
+    def unlock(self):
+        self.bus.lock.release()
+
+    def scan(self):
+        # Straight to the bus, absent addresses should not show up in the stats
+        found = []
+        with self.bus.lock:
+            for address in range(0x08, 0x78):
+                try:
+                    self.bus._bus.read_byte(address)
+                    found.append(address)
+                except OSError:
+                    pass
+        return found
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self.bus.transfer(address, bytes(buffer[start:end]))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        buffer[start:end] = bytes(self.bus.transfer(address, read=end - start))
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        in_end = len(buffer_in) if in_end is None else in_end
+        buffer_in[in_start:in_end] = bytes(self.bus.transfer(address, bytes(buffer_out[out_start:out_end]),
+                                                             in_end - in_start))
+
+    def deinit(self):
+        pass
+
+
+# Buses opened so far, by number
+_buses = {}
+_buses_lock = threading.Lock()
+
+def shared_bus(bus=1, stats=None):
+    """
+    Args:
+        bus: Bus number, 1 on the Raspberry Pi header.
+        stats: Instrumentation to time the transactions with, if given.
+
+    Returns:
+        I2CBus: The process-wide handle of an I2C bus, opened on first use.
+    """
+    with _buses_lock:
+        if bus not in _buses:
+            _buses[bus] = I2CBus(bus)
+        if stats is not None:
+            _buses[bus].stats = stats
+        return _buses[bus]
@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from hal import GPIO
+from PCF8574 import KEYS
+
+
+# kind is 'press', 'long' (held for long_press seconds) or 'release'
+KeyEvent = namedtuple('KeyEvent', ['key', 'kind', 'timestamp'])
+
+# Joystick center key GPIO (BCM) on the Pioneer600
+CENTER_KEY = 20
+# Joystick arrow keys on the PCF8574 expander, active low
+ARROW_KEYS = (('left', 0x01), ('up', 0x02), ('down', 0x04), ('right', 0x08))
+
+
+class InputManager:
+    """
+    Turns the joystick into a thread-safe queue of debounced key events.
+
+    The center key is edge-triggered through GPIO.add_event_detect. The arrow
+    keys sit on the PCF8574 expander (a PCF8574.PCF8574): they are read when
+    its interrupt line fires if interrupt_pin is given, otherwise by a
+    lightweight poller that does one single-byte read every poll_interval.
+    Once no key was held for idle_after seconds the poller slows down to
+    idle_poll_interval, the first press brings it back up to speed.
+
+    A press of a key in long_press_keys is only reported once the key is
+    released, and not at all if it was held into a long press, so a key can
+    do one thing on a short press and another on a long one.
+    """
+
+    def __init__(self, expander, center_pin=CENTER_KEY, interrupt_pin=None,
+                 poll_interval=0.02, idle_poll_interval=0.1, idle_after=5, debounce=0.03, long_press=1.0,
+                 long_press_keys=(), on_event=None):
+        self.expander = expander
+        self.center_pin = center_pin
+        self.interrupt_pin = interrupt_pin
+        self.poll_interval = poll_interval
+        self.idle_poll_interval = idle_poll_interval
+        self.idle_after = idle_after
+        self.debounce = debounce
+        self.long_press = long_press
+        self.long_press_keys = set(long_press_keys)
+        # Called from the input threads after an event was queued, e.g. to wake the main loop
+        self.on_event = on_event
+        self.events = queue.Queue()
+        # key -> [pressed, time of last accepted change, long press reported]
+        self._keys = {key: [False, 0.0, False] for key in ['center'] + [k for k, _ in ARROW_KEYS]}
+        # Guards the key states and keeps events in order between the GPIO
+        # callback and the poller; reentrant for _check_held() -> _update()
+        self._lock = threading.RLock()
+        self._irq = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.center_pin, GPIO.IN, GPIO.PUD_UP)
+        GPIO.add_event_detect(self.center_pin, GPIO.BOTH, callback=self._center_edge)
+        if self.interrupt_pin is not None:
+            GPIO.setup(self.interrupt_pin, GPIO.IN, GPIO.PUD_UP)
+            GPIO.add_event_detect(self.interrupt_pin, GPIO.FALLING, callback=lambda channel: self._irq.set())
+        # Release the key pins so they can be read as inputs
+        self.expander.write(KEYS, KEYS)
+        self._thread = threading.Thread(target=self._run, name='inputs', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._irq.set()
+        GPIO.remove_event_detect(self.center_pin)
+        if self.interrupt_pin is not None:
+            GPIO.remove_event_detect(self.interrupt_pin)
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self, timeout=None):
+        """
+        Returns:
+            KeyEvent: Next event, or None if none arrived within timeout.
+        """
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        """
+        Returns:
+            list: All queued events, oldest first, without blocking.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _emit(self, key, kind, now):
+        self.events.put(KeyEvent(key, kind, now))
+        if self.on_event is not None:
+            self.on_event()
+
+    def _update(self, key, pressed, now):
+        """
+        Accepts a key level, ignoring changes within debounce of the last
+        accepted one (contact bounce).
+        """
+        with self._lock:
+            state = self._keys[key]
+            if pressed == state[0] or now - state[1] < self.debounce:
+                return
+            long_reported = state[2]
+            state[0] = pressed
+            state[1] = now
+            state[2] = False
+            if key in self.long_press_keys:
+                # Held back until it's clear this isn't a long press
+                if pressed:
+                    return
+                if not long_reported:
+                    self._emit(key, 'press', now)
+            self._emit(key, 'press' if pressed else 'release', now)
+
+    def _center_edge(self, channel):
+        self._update('center', GPIO.input(self.center_pin) == 0, time.monotonic())
+
+    def _scan_arrows(self, now):
+        value = self.expander.read()
+        for key, mask in ARROW_KEYS:
+            self._update(key, not value & mask, now)
+
+    def _check_held(self, now):
+        """
+        Reports long presses and catches a center release edge lost to bouncing.
+        """
+        held = False
+        with self._lock:
+            for key, state in self._keys.items():
+                if not state[0]:
+                    continue
+                held = True
+                if key == 'center' and GPIO.input(self.center_pin) != 0:
+                    self._update(key, False, now)
+                    continue
+                if not state[2] and now - state[1] >= self.long_press:
+                    state[2] = True
+                    self._emit(key, 'long', now)
+        return held
+
+    def _poll_interval(self, now, last_held):
+        """
+        Returns:
+            float: Seconds until the next scan without an interrupt line.
+        """
+        return self.poll_interval if now - last_held < self.idle_after else self.idle_poll_interval
+
+    def _run(self):
+        held = False
+        last_held = time.monotonic()
+        while not self._stopped.is_set():
+            if self.interrupt_pin is None:
+                self._stopped.wait(self._poll_interval(time.monotonic(), last_held))
+                scan = True
+            else:
+                # Idle until the expander interrupts, but keep ticking while
+                # a key is held to time long presses
+                scan = self._irq.wait(self.poll_interval if held else None)
+                self._irq.clear()
+            now = time.monotonic()
+            try:
+                if scan or held:
+                    self._scan_arrows(now)
+            except OSError as e:
+                print(f"Error reading keys: {e}")
+            held = self._check_held(now)
+            if held:
+                last_held = now
@@ -0,0 +1,179 @@
+import json
+import os
+import time
+from bisect import bisect_left
+
+
+# Upper bounds (seconds) of the latency buckets: 50 us doubling up to ~13 s
+BUCKETS = [0.00005 * 2**i for i in range(19)]
+
+
+class RollingHistogram:
+    """
+    Latency histogram over roughly the last one to two windows.
+
+    Samples go into fixed log-spaced buckets, so add() is a bisect and an
+    increment whatever the sample rate. Every window seconds the current
+    counts become the previous ones and the oldest are dropped.
+    """
+
+    def __init__(self, window=60, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._current = [0] * (len(BUCKETS) + 1)
+        self._previous = [0] * (len(BUCKETS) + 1)
+        self._rotated = clock()
+        # All-time totals
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        now = self._clock()
+        if now - self._rotated >= self.window:
+            self._previous = self._current if now - self._rotated < 2 * self.window else [0] * len(self._current)
+            self._current = [0] * len(self._previous)
+            self._rotated = now
+        self._current[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        Returns:
+            float: Upper bound in seconds of the bucket holding the q-th
+                   percentile of the recent samples, None without samples.
+        """
+        counts = [a + b for a, b in zip(self._current, self._previous)]
+        seen = sum(counts)
+        if seen == 0:
+            return None
+        rank = q / 100 * seen
+        running = 0
+        for index, count in enumerate(counts):
+            running += count
+            if running >= rank and count:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+
+class _Timer:
+    __slots__ = ('_stats', '_name', '_started')
+
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._stats.record(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class Instrumentation:
+    """
+    Always-on timing of the dashboard's hot paths.
+
+    Stages are timed with record(name, seconds) or the time(name) context
+    manager, each into its own RollingHistogram. frame() also counts the
+    passes that overran the frame budget.
+
+    Collectors record from their own threads. Recording takes no lock to stay
+    cheap on the hot path; two samples landing in the same bucket at the
+    very same moment may count as one, which is fine for statistics.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.frames = 0
+        self.overruns = 0
+        self.started = time.time()
+        self._histograms = {}
+
+    def record(self, name, seconds):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, RollingHistogram(self.window))
+        histogram.add(seconds)
+
+    def time(self, name):
+        """
+        Returns:
+            Context manager recording the time spent in its block under name.
+        """
+        return _Timer(self, name)
+
+    def frame(self, seconds, budget):
+        """
+        Records one main loop pass and whether it took longer than budget seconds.
+        """
+        self.record('frame', seconds)
+        self.frames += 1
+        if seconds > budget:
+            self.overruns += 1
+
+    def percentile(self, name, q):
+        """
+        Returns:
+            float: q-th percentile of a stage in seconds, or None.
+        """
+        histogram = self._histograms.get(name)
+        return None if histogram is None else histogram.percentile(q)
+
+    def slowest(self, prefix=''):
+        """
+        Returns:
+            tuple: (name, p99 seconds) of the stage starting with prefix that has
+                   the worst recent p99, or None.
+        """
+        worst = None
+        for name, histogram in list(self._histograms.items()):
+            if not name.startswith(prefix) or name == 'frame':
+                continue
+            p99 = histogram.percentile(99)
+            if p99 is not None and (worst is None or p99 > worst[1]):
+                worst = (name, p99)
+        return worst
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Frame and overrun counts plus count, mean, p50, p99 and max
+                  in milliseconds of every stage.
+        """
+        stages = {}
+        for name, histogram in sorted(list(self._histograms.items())):
+            p50 = histogram.percentile(50)
+            p99 = histogram.percentile(99)
+            stages[name] = {
+                'count': histogram.count,
+                'mean_ms': round(histogram.total / histogram.count * 1000, 3),
+                'p50_ms': None if p50 is None else round(p50 * 1000, 3),
+                'p99_ms': None if p99 is None else round(p99 * 1000, 3),
+                'max_ms': round(histogram.max * 1000, 3),
+            }
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - self.started),
+            'frames': self.frames,
+            'overruns': self.overruns,
+            'stages': stages,
+        }
+
+    def write(self, path, extra=None):
+        """
+        Writes snapshot() as JSON, plus the entries of extra if given,
+        replacing path atomically so readers never see a half-written file.
+        """
+        snapshot = self.snapshot()
+        if extra:
+            snapshot.update(extra)
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(temp, path)
@@ -0,0 +1,170 @@
+import os
+
+from PIL import Image
+from PIL import ImageFont
+
+from SSD1306 import pack_buffer
+from glyphs import GlyphFont
+from screens import ScreenTemplate
+
+
+# Screen layouts of the 128x64 panel, shared by the dashboard and the benchmarks
+width = 128
+height = 64
+
+# First define some constants to allow easy resizing of shapes.
+padding = 1
+top = padding
+x = padding
+
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Load default font.
+font = ImageFont.load_default()
+headerFont = ImageFont.truetype(os.path.join(FONT_DIR, 'NimbusSanL-Bol.otf'), 10.2)
+textFont = ImageFont.truetype(os.path.join(FONT_DIR, 'NimbusSanL-Reg.otf'), 10)
+# Glyph atlases: text is drawn from pre-rendered glyph bitmaps and cached strings
+headerGlyphs = GlyphFont(headerFont)
+textGlyphs = GlyphFont(textFont)
+
+
+def sparkline_points(values, box):
+    """
+    Scales a series into a polyline inside box, skipping gaps.
+
+    Args:
+        values: Series oldest first, None where there is no data.
+        box: (x0, y0, x1, y1) area to draw in.
+
+    Returns:
+        tuple: (x, y) points, empty if there is no data.
+    """
+    x0, y0, x1, y1 = box
+    known = [v for v in values if v is not None]
+    if not known:
+        return ()
+    low, high = min(known), max(known)
+    if high == low:
+        # Flat series, draw it through the middle of the box
+        low, high = low - 1, high + 1
+    step = (x1 - x0) / max(len(values) - 1, 1)
+    return tuple((round(x0 + i*step), round(y1 - (v - low) / (high - low) * (y1 - y0)))
+                 for i, v in enumerate(values) if v is not None)
+
+
+def draw_sparkline(draw, box, points):
+    if len(points) > 1:
+        draw.line(points, fill=255)
+    elif points:
+        draw.point(points, fill=255)
+
+
+# Screen templates: labels are rendered once, only changed values are redrawn
+homeScreen = ScreenTemplate((width, height))
+homeScreen.text_field('datetime', (x, top), headerGlyphs)
+#homeScreen.label((x, top), ("_______________________"), headerGlyphs)
+homeScreen.text_field('cpu_temp', (x, top+15), textGlyphs, " CPU Temp: ", end=103, height=10)
+homeScreen.field('cpu_sparkline', (104, top+15, width, top+25), render=draw_sparkline)
+homeScreen.text_field('ram', (x, top+25), textGlyphs, " RAM: ", height=10)
+homeScreen.text_field('disk', (x, top+35), textGlyphs, " Disk: ", height=10)
+homeScreen.text_field('power', (x, top+45), textGlyphs, height=10)
+homeScreen.text_field('battery', (x, top+55), textGlyphs, " Battery: ", height=10)
+# Where the CPU temperature sparkline is drawn inside its field
+CPU_SPARKLINE_BOX = (104, top+17, 126, top+24)
+
+networkScreen = ScreenTemplate((width, height))
+networkScreen.label((x, top), ("Network Stats:"), headerGlyphs)
+#networkScreen.label((x, top+1), "________", textGlyphs)
+# Long interface names and IPv6 addresses scroll through their fields
+networkScreen.text_field('interface_name', (x, top+15), textGlyphs, " Interface: ", height=10, marquee=True)
+networkScreen.text_field('internal_ip', (x, top+25), textGlyphs, " Int IP: ", height=10, marquee=True)
+networkScreen.text_field('user', (x, top+35), textGlyphs, " User: ", height=10, marquee=True)
+networkScreen.text_field('external_ip', (x, top+45), textGlyphs, " Ext IP: ", height=10, marquee=True)
+# Receive / transmit rate of the active interface
+networkScreen.text_field('throughput', (x, top+55), textGlyphs, " Rx/Tx: ", height=10, marquee=True)
+
+noNetworkScreen = ScreenTemplate((width, height))
+noNetworkScreen.label((x, top), ("Network Stats:"), headerGlyphs)
+noNetworkScreen.label((x, top+27), "No active ", textGlyphs)
+noNetworkScreen.label((x, top+37), "network interface", textGlyphs)
+noNetworkScreen.label((x, top+47), "found", textGlyphs)
+
+upsScreen = ScreenTemplate((width, height))
+upsScreen.label((x, top), ("UPS Stats:"), headerGlyphs)
+#upsScreen.label((x, top+1), "__________", textGlyphs)
+upsScreen.text_field('bus_voltage', (x, top+15), textGlyphs, " Load Voltage: ")
+upsScreen.text_field('current', (x, top+27), textGlyphs, " Current: ")
+upsScreen.text_field('power', (x, top+39), textGlyphs, " Power: ", end=83)
+upsScreen.field('power_sparkline', (84, top+40, width, top+49), render=draw_sparkline)
+upsScreen.text_field('percent', (x, top+51), textGlyphs, " Percent: ")
+# Where the power sparkline is drawn inside its field
+POWER_SPARKLINE_BOX = (84, top+41, 126, top+48)
+
+roomScreen = ScreenTemplate((width, height))
+roomScreen.label((x, top), ("Room Conditions:"), headerGlyphs)
+#roomScreen.label((x, top+1), "________", textGlyphs)
+roomScreen.text_field('temperature', (x, top+15), textGlyphs, " Temp: ")
+roomScreen.text_field('humidity', (x, top+27), textGlyphs, " Hum: ")
+roomScreen.text_field('pressure', (x, top+39), textGlyphs, " Pressure: ")
+roomScreen.text_field('co2', (x, top+51), textGlyphs, " CO2: ")
+
+surveillanceScreen = ScreenTemplate((width, height))
+surveillanceScreen.label((x, top), ("Surveillance:"), headerGlyphs)
+#surveillanceScreen.label((x, top+1), "________", textGlyphs)
+surveillanceScreen.label((x, top+15), " Status: ON", textGlyphs)
+surveillanceScreen.label((x, top+30), " Storage: SD/USB", textGlyphs)
+surveillanceScreen.text_field('disk', (x, top+45), textGlyphs, " Disk: ")
+#surveillanceScreen.label((x, top+45), "***: ", textGlyphs)
+
+# Hidden screen with the dashboard's own timings, see instrumentation.py
+statsScreen = ScreenTemplate((width, height))
+statsScreen.label((x, top), ("Dashboard Stats:"), headerGlyphs)
+statsScreen.text_field('frame', (x, top+15), textGlyphs, " Frame: ")
+statsScreen.text_field('overruns', (x, top+27), textGlyphs, " Overruns: ")
+statsScreen.text_field('transfer', (x, top+39), textGlyphs, " SPI: ")
+statsScreen.text_field('slowest', (x, top+51), textGlyphs, " Slowest: ")
+
+
+#QR code to connect via WebSSH:
+# Packed QR code frame of the last connection URL, rebuilt only when it changes
+qrCache = {}
+
+def qr_frame(url):
+    """
+    Returns:
+        bytes: Display buffer showing url as a QR code.
+    """
+    if url in qrCache:
+        return qrCache[url]
+    # Only needed for this screen, not at startup
+    import qrcode
+
+    # Create the QR code
+    qr = qrcode.QRCode(
+        version=1,  # Adjust version for longer URLs if needed
+        box_size=1,
+        border=0  # Remove border for cleaner appearance
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    # Generate a white QR code image
+    qr_img = qr.make_image(fill_color="white", back_color="black")
+
+    # Resize to 64x64 pixels
+    qr_img = qr_img.resize((64, 64), Image.LANCZOS)
+
+    # Create a blank image for the display
+    oled_img = Image.new("1", (width, height), color=0)  # 1-bit mode for OLED compatibility
+
+    # Calculate center coordinates
+    x_center = (oled_img.width - qr_img.width) // 2
+    y_center = (oled_img.height - qr_img.height) // 2
+
+    # Paste QR code onto the display image
+    oled_img.paste(qr_img, (x_center, y_center))
+
+    # A new address makes the old code useless, keep only the current one
+    qrCache.clear()
+    qrCache[url] = bytes(pack_buffer(oled_img.tobytes(), width, height // 8))
+    return qrCache[url]
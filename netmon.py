@@ -0,0 +1,208 @@
+import errno
+import os
+import select
+import socket
+import threading
+import time
+
+from collectors import get_network_info, get_network_signature
+
+
+# rtnetlink multicast groups (linux/rtnetlink.h): link and address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+
+class InterfaceMonitor:
+    """
+    Keeps the active interface and its address cached, re-reading them only
+    when the kernel reports a link or address change on an rtnetlink socket.
+
+    The read happens in the monitor thread and its result is handed to
+    on_update, also every resync seconds in case a notification was lost.
+    Without netlink (not Linux, or not allowed) it falls back to polling the
+    cheap interface signature every poll_interval seconds.
+    """
+
+    def __init__(self, read=get_network_info, resync=60, poll_interval=5, settle=0.2,
+                 on_update=None, stats=None):
+        self.read = read
+        self.resync = resync
+        self.poll_interval = poll_interval
+        # Quiet time after a notification: an interface coming up sends a burst
+        self.settle = settle
+        self.on_update = on_update
+        # Optional Instrumentation timing every read as 'net.interfaces'
+        self.stats = stats
+        self.netlink = False
+        self.errors = 0
+        self._value = None
+        self._socket = None
+        # Written to by stop() to end the wait for netlink messages
+        self._wakeup = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._open_netlink()
+        if self._socket is not None:
+            self._wakeup = os.pipe()
+        self._thread = threading.Thread(target=self._run, name='interfaces', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._wakeup is not None:
+            os.write(self._wakeup[1], b'x')
+        if self._thread is not None:
+            self._thread.join()
+        self._close_netlink()
+        if self._wakeup is not None:
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+
+    def _open_netlink(self):
+        """
+        Opens the rtnetlink socket, or leaves it None to poll instead.
+        """
+        sock = None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        except (OSError, AttributeError) as e:
+            print(f"No netlink, polling network interfaces: {e}")
+            if sock is not None:
+                sock.close()
+                sock = None
+        self._socket = sock
+        self.netlink = sock is not None
+
+    def _close_netlink(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def get(self):
+        """
+        Returns:
+            dict: Last read network info, None before the first read.
+        """
+        return self._value
+
+    def refresh(self):
+        """
+        Reads the network info now and hands it to on_update.
+        """
+        started = time.perf_counter()
+        try:
+            value = self.read()
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading network interfaces: {e}")
+            return
+        if self.stats is not None:
+            self.stats.record('net.interfaces', time.perf_counter() - started)
+        self._value = value
+        if self.on_update is not None:
+            self.on_update(value)
+
+    def _wait_for_change(self, timeout):
+        """
+        Blocks until the kernel reports a change and the burst of messages
+        is over, or timeout passes.
+
+        Returns:
+            bool: True on a change.
+        """
+        changed = False
+        while True:
+            ready, _, _ = select.select([self._socket, self._wakeup[0]], [], [], timeout)
+            if self._socket not in ready:
+                return changed
+            try:
+                self._socket.recv(65536)
+            except OSError as e:
+                # ENOBUFS: messages were dropped, something changed anyway
+                if e.errno != errno.ENOBUFS:
+                    raise
+            changed = True
+            timeout = self.settle
+
+    def _run(self):
+        self.refresh()
+        signature = get_network_signature()
+        while not self._stopped.is_set():
+            if self._socket is not None:
+                try:
+                    self._wait_for_change(self.resync)
+                except OSError as e:
+                    # Reopen after a pause, polling from now on if that fails
+                    self.errors += 1
+                    print(f"Error reading netlink, reopening: {e}")
+                    self._close_netlink()
+                    if self._stopped.wait(self.poll_interval):
+                        break
+                    self._open_netlink()
+                    signature = get_network_signature()
+                if not self._stopped.is_set():
+                    self.refresh()
+                continue
+            # Polling fallback: a full read only when the signature changed
+            deadline = time.monotonic() + self.resync
+            while not self._stopped.wait(self.poll_interval):
+                current = get_network_signature()
+                if current != signature or time.monotonic() >= deadline:
+                    signature = current
+                    break
+            self.refresh()
+
+
+class ThroughputMeter:
+    """
+    Receive and transmit rates of every interface from the deltas of the
+    byte counters in /proc/net/dev, one small read per sample.
+    """
+
+    def __init__(self, path='/proc/net/dev', clock=time.monotonic):
+        self.path = path
+        self._clock = clock
+        self._counters = None
+        self._measured = None
+
+    def counters(self):
+        """
+        Returns:
+            dict: {interface: (rx bytes, tx bytes)} since boot.
+        """
+        counters = {}
+        with open(self.path) as f:
+            # Two header lines, then "iface: rx_bytes ... (8 rx fields) tx_bytes ..."
+            for line in f.readlines()[2:]:
+                interface, _, fields = line.partition(':')
+                fields = fields.split()
+                if len(fields) >= 9:
+                    counters[interface.strip()] = (int(fields[0]), int(fields[8]))
+        return counters
+
+    def read(self):
+        """
+        Returns:
+            dict: {interface: (rx, tx)} in bytes per second since the last
+                  read, empty on the first read.
+        """
+        now = self._clock()
+        counters = self.counters()
+        rates = {}
+        if self._counters is not None and now > self._measured:
+            elapsed = now - self._measured
+            for interface, (rx, tx) in counters.items():
+                previous = self._counters.get(interface)
+                # A new interface or a counter reset has no rate yet
+                if previous is not None and rx >= previous[0] and tx >= previous[1]:
+                    rates[interface] = ((rx - previous[0]) / elapsed, (tx - previous[1]) / elapsed)
+        self._counters = counters
+        self._measured = now
+        return rates
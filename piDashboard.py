@@ -1,217 +1,10 @@
+import os
 import time
-from datetime import datetime
-import smbus
-import spidev as SPI
+# Only what the first frame needs is imported before it is shown
+from startup import process_age, splash_frame, Snapshot
+from hal import SpiDev
 import SSD1306
 
-import os
-import subprocess
-import re
-import psutil
-
-import socket
-import requests
-import urllib.request
-import netifaces as ni  # Install with: pip install netifaces
-
-import RPi.GPIO as GPIO
-
-from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
-
-import qrcode
-
-
-#Configuring UPS:
-class BusVoltageRange:
-    """Constants for ``bus_voltage_range``"""
-    RANGE_16V               = 0x00      # set bus voltage range to 16V
-    RANGE_32V               = 0x01      # set bus voltage range to 32V (default)
-
-class Gain:
-    """Constants for ``gain``"""
-    DIV_1_40MV              = 0x00      # shunt prog. gain set to  1, 40 mV range
-    DIV_2_80MV              = 0x01      # shunt prog. gain set to /2, 80 mV range
-    DIV_4_160MV             = 0x02      # shunt prog. gain set to /4, 160 mV range
-    DIV_8_320MV             = 0x03      # shunt prog. gain set to /8, 320 mV range
-
-class ADCResolution:
-    """Constants for ``bus_adc_resolution`` or ``shunt_adc_resolution``"""
-    ADCRES_9BIT_1S          = 0x00      #  9bit,   1 sample,     84us
-    ADCRES_10BIT_1S         = 0x01      # 10bit,   1 sample,    148us
-    ADCRES_11BIT_1S         = 0x02      # 11 bit,  1 sample,    276us
-    ADCRES_12BIT_1S         = 0x03      # 12 bit,  1 sample,    532us
-    ADCRES_12BIT_2S         = 0x09      # 12 bit,  2 samples,  1.06ms
-    ADCRES_12BIT_4S         = 0x0A      # 12 bit,  4 samples,  2.13ms
-    ADCRES_12BIT_8S         = 0x0B      # 12bit,   8 samples,  4.26ms
-    ADCRES_12BIT_16S        = 0x0C      # 12bit,  16 samples,  8.51ms
-    ADCRES_12BIT_32S        = 0x0D      # 12bit,  32 samples, 17.02ms
-    ADCRES_12BIT_64S        = 0x0E      # 12bit,  64 samples, 34.05ms
-    ADCRES_12BIT_128S       = 0x0F      # 12bit, 128 samples, 68.10ms
-
-class Mode:
-    """Constants for ``mode``"""
-    POWERDOW                = 0x00      # power down
-    SVOLT_TRIGGERED         = 0x01      # shunt voltage triggered
-    BVOLT_TRIGGERED         = 0x02      # bus voltage triggered
-    SANDBVOLT_TRIGGERED     = 0x03      # shunt and bus voltage triggered
-    ADCOFF                  = 0x04      # ADC off
-    SVOLT_CONTINUOUS        = 0x05      # shunt voltage continuous
-    BVOLT_CONTINUOUS        = 0x06      # bus voltage continuous
-    SANDBVOLT_CONTINUOUS    = 0x07      # shunt and bus voltage continuous
-
-
-class INA219:
-    def __init__(self, i2c_bus=1, addr=0x40):
-        self.bus = smbus.SMBus(i2c_bus);
-        self.addr = addr
-
-        # Set chip to known config values to start
-        self._cal_value = 0
-        self._current_lsb = 0
-        self._power_lsb = 0
-        self.set_calibration_32V_2A()
-
-    def read(self,address):
-        data = self.bus.read_i2c_block_data(self.addr, address, 2)
-        return ((data[0] * 256 ) + data[1])
-
-    def write(self,address,data):
-        temp = [0,0]
-        temp[1] = data & 0xFF
-        temp[0] =(data & 0xFF00) >> 8
-        self.bus.write_i2c_block_data(self.addr,address,temp)
-
-    def set_calibration_32V_2A(self):
-        """Configures to INA219 to be able to measure up to 32V and 2A of current. Counter
-           overflow occurs at 3.2A.
-           ..note :: These calculations assume a 0.1 shunt ohm resistor is present
-        """
-        # By default we use a pretty huge range for the input voltage,
-        # which probably isn't the most appropriate choice for system
-        # that don't use a lot of power.  But all of the calculations
-        # are shown below if you want to change the settings.  You will
-        # also need to change any relevant register settings, such as
-        # setting the VBUS_MAX to 16V instead of 32V, etc.
-
-        # VBUS_MAX = 32V             (Assumes 32V, can also be set to 16V)
-        # VSHUNT_MAX = 0.32          (Assumes Gain 8, 320mV, can also be 0.16, 0.08, 0.04)
-        # RSHUNT = 0.1               (Resistor value in ohms)
-
-        # 1. Determine max possible current
-        # MaxPossible_I = VSHUNT_MAX / RSHUNT
-        # MaxPossible_I = 3.2A
-
-        # 2. Determine max expected current
-        # MaxExpected_I = 2.0A
-
-        # 3. Calculate possible range of LSBs (Min = 15-bit, Max = 12-bit)
-        # MinimumLSB = MaxExpected_I/32767
-        # MinimumLSB = 0.000061              (61uA per bit)
-        # MaximumLSB = MaxExpected_I/4096
-        # MaximumLSB = 0,000488              (488uA per bit)
-
-        # 4. Choose an LSB between the min and max values
-        #    (Preferrably a roundish number close to MinLSB)
-        # CurrentLSB = 0.0001 (100uA per bit)
-        self._current_lsb = .1  # Current LSB = 100uA per bit
-
-        # 5. Compute the calibration register
-        # Cal = trunc (0.04096 / (Current_LSB * RSHUNT))
-        # Cal = 4096 (0x1000)
-
-        self._cal_value = 4096
-
-        # 6. Calculate the power LSB
-        # PowerLSB = 20 * CurrentLSB
-        # PowerLSB = 0.002 (2mW per bit)
-        self._power_lsb = .002  # Power LSB = 2mW per bit
-
-        # 7. Compute the maximum current and shunt voltage values before overflow
-        #
-        # Max_Current = Current_LSB * 32767
-        # Max_Current = 3.2767A before overflow
-        #
-        # If Max_Current > Max_Possible_I then
-        #    Max_Current_Before_Overflow = MaxPossible_I
-        # Else
-        #    Max_Current_Before_Overflow = Max_Current
-        # End If
-        #
-        # Max_ShuntVoltage = Max_Current_Before_Overflow * RSHUNT
-        # Max_ShuntVoltage = 0.32V
-        #
-        # If Max_ShuntVoltage >= VSHUNT_MAX
-        #    Max_ShuntVoltage_Before_Overflow = VSHUNT_MAX
-        # Else
-        #    Max_ShuntVoltage_Before_Overflow = Max_ShuntVoltage
-        # End If
-
-        # 8. Compute the Maximum Power
-        # MaximumPower = Max_Current_Before_Overflow * VBUS_MAX
-        # MaximumPower = 3.2 * 32V
-        # MaximumPower = 102.4W
-
-        # Set Calibration register to 'Cal' calculated above
-        self.write(_REG_CALIBRATION,self._cal_value)
-
-        # Set Config register to take into account the settings above
-        self.bus_voltage_range = BusVoltageRange.RANGE_32V
-        self.gain = Gain.DIV_8_320MV
-        self.bus_adc_resolution = ADCResolution.ADCRES_12BIT_32S
-        self.shunt_adc_resolution = ADCResolution.ADCRES_12BIT_32S
-        self.mode = Mode.SANDBVOLT_CONTINUOUS
-        self.config = self.bus_voltage_range << 13 | \
-                      self.gain << 11 | \
-                      self.bus_adc_resolution << 7 | \
-                      self.shunt_adc_resolution << 3 | \
-                      self.mode
-        self.write(_REG_CONFIG,self.config)
-
-    def getShuntVoltage_mV(self):
-        self.write(_REG_CALIBRATION,self._cal_value)
-        value = self.read(_REG_SHUNTVOLTAGE)
-        if value > 32767:
-            value -= 65535
-        return value * 0.01
-
-    def getBusVoltage_V(self):
-        self.write(_REG_CALIBRATION,self._cal_value)
-        self.read(_REG_BUSVOLTAGE)
-        return (self.read(_REG_BUSVOLTAGE) >> 3) * 0.004
-
-    def getCurrent_mA(self):
-        value = self.read(_REG_CURRENT)
-        if value > 32767:
-            value -= 65535
-        return value * self._current_lsb
-
-    def getPower_W(self):
-        self.write(_REG_CALIBRATION,self._cal_value)
-        value = self.read(_REG_POWER)
-        if value > 32767:
-            value -= 65535
-        return value * self._power_lsb
-
-# Config Register (R/W)
-_REG_CONFIG = 0x00
-# SHUNT VOLTAGE REGISTER (R)
-_REG_SHUNTVOLTAGE = 0x01
-
-# BUS VOLTAGE REGISTER (R)
-_REG_BUSVOLTAGE = 0x02
-
-# POWER REGISTER (R)
-_REG_POWER = 0x03
-
-# CURRENT REGISTER (R)
-_REG_CURRENT = 0x04
-
-# CALIBRATION REGISTER (R/W)
-_REG_CALIBRATION = 0x05
-
-
 
 #Configuring OLED display via SPI:
 # Raspberry Pi pin configuration:
@@ -222,170 +15,512 @@ bus = 0
 device = 0
 
 # 128x64 display with hardware SPI:
-disp = SSD1306.SSD1306(RST, DC, SPI.SpiDev(bus,device))
+disp = SSD1306.SSD1306(RST, DC, SpiDev(bus,device))
 # Initialize library.
 disp.begin()
 
+# Show the home screen the last run saved (or a splash) right away, the
+# rest of the dashboard loads and the collectors warm up behind it
+snapshot = Snapshot()
+disp.set_buffer(snapshot.load_frame(len(disp.get_buffer())) or splash_frame(disp.width, disp.height))
+disp.display()
+startupTimes = {'first_frame': round(process_age(), 3)}
+print(f"First frame after {startupTimes['first_frame']*1000:.0f} ms")
 
-#Configuring BMP280:
 
+from datetime import datetime
+import getpass
+import tempfile
+
+from PIL import Image
+from PIL import ImageDraw
 
+from INA219 import INA219, INA219Sampler
+from scheduler import RenderScheduler
+from history import HistoryStore
+from screens import ScreenNavigator
+from layouts import x, top, headerGlyphs, sparkline_points, qr_frame, CPU_SPARKLINE_BOX, POWER_SPARKLINE_BOX
+from layouts import homeScreen, networkScreen, noNetworkScreen, upsScreen, roomScreen, surveillanceScreen, statsScreen
+from inputs import InputManager
+from PCF8574 import PCF8574, BEEP_3X
+from i2cbus import shared_bus
+from instrumentation import Instrumentation
+from exporter import MetricsServer
+from power import PowerManager
+from sensors import SensorPoller, backend, BMP280Backend, SimulatedBMP280, DHT22Backend, SimulatedDHT22
+from sensors import MHZ19Backend, SimulatedMHZ19
+from collectors import CollectorRegistry, CPUTempReader, get_ram_info, get_disk_usage
+from collectors import ExternalIPResolver
+from netmon import InterfaceMonitor, ThroughputMeter
+
+
+#Configuring instrumentation:
+# Timings of every collector and render stage, shown on the hidden stats
+# screen (long press on the center key) and written to STATS_FILE
+instruments = Instrumentation()
+STATS_FILE = os.environ.get('PIDASHBOARD_STATS', os.path.join(tempfile.gettempdir(), 'piDashboard-stats.json'))
+STATS_INTERVAL = 30
+
+
+# Room sensors are read in their own threads and publish into the metrics
+# cache, started once the metrics below are registered
+#Configuring BMP280:
+# Temperature and pressure over I2C, cheap to read every 2 s
+bmp280 = SensorPoller('bmp280', backend(BMP280Backend, SimulatedBMP280), 2,
+                      on_update=lambda reading: metrics.publish('bmp280', reading), stats=instruments)
 
 
 #Configuring DHT22:
+# Humidity over a bit-banged wire: at most one read every 2 s and many fail,
+# so failed reads are retried in the sensor thread
+dht22 = SensorPoller('dht22', backend(DHT22Backend, SimulatedDHT22), 5, retries=3, retry_delay=2.1,
+                     on_update=lambda reading: metrics.publish('dht22', reading), stats=instruments)
 
 
+#Configuring CO2 Meter:
+# MH-Z19 over the UART, it measures about every 5 s
+co2_meter = SensorPoller('co2', backend(MHZ19Backend, SimulatedMHZ19), 10,
+                         on_update=lambda reading: metrics.publish('co2', reading), stats=instruments)
 
 
-#Configuring CO2 Meter:
+#Configuring I2C:
+# One handle of bus 1 for the UPS, the joystick expander and the BMP280;
+# transactions are serialized and timed per device
+i2c = shared_bus(1, stats=instruments)
 
 
+#Configuring metric collectors:
+#Configuring UPS:
+# One INA219 instance for the whole run, sampled in the background and
+# averaged so the battery percent is not based on a single noisy reading
+ina219 = INA219(addr=0x42)
+ups_sampler = INA219Sampler(ina219, rate=5, window=10).start()
+
+# Each metric is refreshed on its own timescale (seconds)
+metrics = CollectorRegistry(stats=instruments)
+cpu_temp_reader = CPUTempReader()
+metrics.register('cpu_temp', cpu_temp_reader.read, 2)
+metrics.register('ram', get_ram_info, 5)
+metrics.register('disk', lambda: get_disk_usage("/"), 60)
+# The interface monitor publishes the network info when the kernel reports
+# a change (and every minute); the byte rates are one read of /proc/net/dev
+metrics.register('network', None, 60)
+throughput = ThroughputMeter()
+metrics.register('throughput', throughput.read, 5)
+# The external IP is looked up in the background and published when it resolves
+metrics.register('external_ip', None, 15*60)
+metrics.register('ups', ups_sampler.average, 2)
+# Published by the room sensors
+metrics.register('bmp280', None, bmp280.interval)
+metrics.register('dht22', None, dht22.interval)
+metrics.register('co2', None, co2_meter.interval)
+room_sensors = [bmp280.start(), dht22.start(), co2_meter.start()]
+
+external_ip = ExternalIPResolver(on_update=lambda ip: metrics.publish('external_ip', ip), stats=instruments).start()
+
+def network_changed(info):
+  """
+  Caches the network info from the interface monitor's thread.
+  """
+  changed = info != metrics.value('network')
+  metrics.publish('network', info)
+  if changed:
+    # A new interface or address may mean a new external IP
+    external_ip.refresh_now()
+    scheduler.wake()
+
+interfaces = InterfaceMonitor(on_update=network_changed, stats=instruments)
+
+# Cached metrics for other local tools on http://127.0.0.1:METRICS_PORT/metrics
+# (Prometheus) and /metrics.json, optionally on a Unix socket as well
+METRICS_PORT = int(os.environ.get('PIDASHBOARD_METRICS_PORT', 9105)) or None
+METRICS_SOCKET = os.environ.get('PIDASHBOARD_METRICS_SOCKET')
+try:
+  metrics_server = MetricsServer(metrics, port=METRICS_PORT, unix_path=METRICS_SOCKET).start()
+except OSError as e:
+  print(f"Error starting metrics endpoint: {e}")
+
+# Trends for the sparklines, sampled every HISTORY_INTERVAL seconds
+HISTORY_INTERVAL = 5
+history = HistoryStore(['cpu_temp', 'ram', 'disk', 'bus_voltage', 'current', 'power'],
+                       raw_interval=HISTORY_INTERVAL)
+
+
+#Configuring joystick:
+# PCF8574 expander with the arrow keys, buzzer and LED
+address = 0x20
+i2c.name(address, 'pcf8574')
+expander = PCF8574(i2c, address).begin()
+# Not os.getlogin(): started from cron there is no controlling terminal
+username = getpass.getuser()
+
+
+#Configuring rendering:
+def seconds_to_next_minute():
+  """
+  Returns:
+      float: Seconds until the wall clock minute ticks over.
+  """
+  now = datetime.now()
+  return 60 - now.second - now.microsecond / 1000000
+
+
+FRAME_RATE = 30         # max loop iterations (frames) per second
+MARQUEE_INTERVAL = 0.1  # seconds between steps of values scrolling through their fields
+MARQUEE_STEP = 2        # pixels per step
+
+scheduler = RenderScheduler(max_fps=FRAME_RATE)
+scheduler.at('metrics', metrics.next_due())
+scheduler.every('history', HISTORY_INTERVAL)
+scheduler.after('clock', seconds_to_next_minute())
+scheduler.every('stats', STATS_INTERVAL)
+# The frame and metrics shown first on the next start
+SNAPSHOT_INTERVAL = 5*60
+scheduler.after('snapshot', SNAPSHOT_INTERVAL)
+
+# Key events wake the main loop, so a press is handled within a frame.
+# Center opens the QR code on a short press and the stats screen on a long
+# one, its press only counts once it's released
+inputs = InputManager(expander, long_press_keys=('center',), on_event=scheduler.wake).start()
+# Network changes wake the main loop as well
+interfaces.start()
+
+
+#Configuring power profiles:
+# On battery the dashboard samples and renders less, dims the panel and
+# turns it off when no key was pressed for a while; any key turns it back on
+power_manager = PowerManager()
+metrics.register('power_profile', None, 60)
+sensorIntervals = {sensor.name: sensor.interval for sensor in room_sensors}
+# Key that turned the panel back on, ignored until it is released
+wakeKey = None
+# When the UPS reading the profile was last picked from was collected
+upsMeasured = None
+# Set once the low battery warning shows, the Pi powers off SHUTDOWN_DELAY later
+shuttingDown = False
+SHUTDOWN_DELAY = 6
+
+def apply_profile(profile):
+  """
+  Switches sampling rates, frame rate and the panel to an operating profile.
+  """
+  print(f"Power profile: {profile.name}")
+  scheduler.frame_interval = 1.0 / profile.frame_rate
+  metrics.scale_intervals(profile.interval_scale)
+  scheduler.at('metrics', metrics.next_due())
+  for sensor in room_sensors:
+    sensor.interval = sensorIntervals[sensor.name] * profile.interval_scale
+  ups_sampler.interval = 1.0 / profile.ups_rate
+  disp.dim(profile.dim)
+  if profile.display_timeout is None:
+    disp.wake()
+
+# Create blank image for drawing.
+# Make sure to create image with mode '1' for 1-bit color.
+width = disp.width
+height = disp.height
+image = Image.new('1', (width, height))
+
+# Get drawing object to draw on image.
+draw = ImageDraw.Draw(image)
+
+# Template currently on the panel, the URL for the QR code, None after the warning
+shownScreen = None
+
+def present(screen, values):
+  """
+  Updates a screen template and pushes it to the display if a value changed
+  or another screen was showing.
+  """
+  global shownScreen
+  # Plain timestamps, cheaper than timer context managers on every pass
+  started = time.perf_counter()
+  changed = screen.update(values)
+  # Values too wide for their field scroll through it; only the pages of
+  # the field are sent again
+  if screen.overflowing():
+    if scheduler.due('marquee'):
+      changed = screen.advance(MARQUEE_STEP) or changed
+    if not scheduler.pending('marquee'):
+      scheduler.after('marquee', MARQUEE_INTERVAL)
+  else:
+    scheduler.cancel('marquee')
+  rendered = time.perf_counter()
+  instruments.record('render', rendered - started)
+  rows = screen.take_dirty_rows()
+  if changed or shownScreen is not screen:
+    if shownScreen is screen and rows is not None:
+      # Same screen: only the pages of the fields that were redrawn
+      disp.image_rows(screen.image, *rows)
+    else:
+      disp.image(screen.image)
+    packed = time.perf_counter()
+    disp.display()
+    instruments.record('pack', packed - rendered)
+    instruments.record('transfer', time.perf_counter() - packed)
+    shownScreen = screen
 
+# Alternatively load a TTF font.  Make sure the .ttf font file is in the same directory as the python script!
+# Some other nice fonts to try: http://www.dafont.com/bitmap.php
+# Icons website: https://icons8.com/line-awesome
+#font = ImageFont.truetype('PixelOperator.ttf', 16)
+#icon_font= ImageFont.truetype('lineawesome-webfont.ttf', 18)
 
-while True:
-  
-  #Configuring CPU Readings:
-  def get_cpu_temp():
-    """
-    Retrieves CPU temperature from Raspberry Pi using vcgencmd command.
-
-    Returns:
-        float: CPU temperature in degrees Celsius, or None if an error occurs.
-    """
-    try:
-      # Execute the vcgencmd command to get temperature
-      output = subprocess.run(["vcgencmd", "measure_temp"], capture_output=True, text=True, check=True)
-      # Extract the temperature value from the output
-      match = re.search(r"temp=(\d+\.?\d*)", output.stdout)
-      if match:
-        return float(match.group(1))
-      else:
-        return None
-    except subprocess.CalledProcessError:
-      # Error occurred during command execution
-      return None
-
-  # Get CPU temperature
-  cpu_temp = get_cpu_temp()
-
-  #if cpu_temp is not None:
-    #print("CPU temperature: {:.1f}°C".format(cpu_temp))
-  #else:
-    #print("Error: Could not read CPU temperature")
-    
-  #Configuring Memory Readings:
-  def get_ram_info():
-    """
-    Retrieves information about used RAM and total RAM capacity.
-
-    Returns:
-        tuple: (used_ram, total_ram), both in MB.
-    """
-    # Get memory usage statistics
-    mem = psutil.virtual_memory()
-    # Convert values from bytes to Megabytes (MB)
-    used_ram = mem.used / (1024 * 1024)
-    total_ram = mem.total / (1024 * 1024)
-    #free_ram = mem.free / (1024 * 1024)
-    return used_ram, total_ram
-
-  # Get RAM information
-  used_ram, total_ram = get_ram_info()
-
-  # Print results. You can modify this for dashboard integration.
-  #print(f"Used RAM: {used_ram:.1f} MB")
-  #print(f"Total RAM: {total_ram:.1f} MB")
-      
-  
-  
-  
-  
-  #Getting Disk Space Info:
-  def get_disk_usage(path):
-    """
-    Gets the free space and total capacity of the disk containing the specified path.
 
-    Args:
-        path: A path on the system disk.
+#Screens and the keys that open them:
+def show_home():
+  # Get current date and time
+  now = datetime.now()
 
-    Returns:
-        tuple: (free_space_gb, total_capacity_gb), both in GB, or None if an error occurs.
-    """
-    try:
-      # Get disk usage statistics using os.statvfs
-      stat = os.statvfs(path)
-      # Calculate free space and total capacity in Gigabytes
-      free_space_gb = stat.f_bavail * stat.f_frsize / (1024 * 1024 * 1024)
-      total_capacity_gb = stat.f_blocks * stat.f_frsize / (1024 * 1024 * 1024)
-      return free_space_gb, total_capacity_gb
-    except OSError as e:
-      print(f"Error getting disk usage: {e}")
-      return None
+  # Format the date and time string
+  #formatted_datetime = now.strftime("%a|%b %d %Y|%H:%M")
+  formatted_datetime = now.strftime("%a | %b %d %Y | %H:%M")
 
-  # Get disk usage information (assuming / is on the system disk)
-  free_space_gb, total_capacity_gb = get_disk_usage("/")
+  #home power line: "# Power: {:1.3f} W".format(power)
+  if current < 0:
+    power_line = " Power: {:1.3f} W".format(power)
+  elif current >0:
+    power_line = " Charging at {:1.4f} A".format(current/1000)
+  else:
+    power_line = ""
+
+  # Everything the home screen shows, at its display precision. Only the
+  # fields that changed are redrawn and only changed bytes are sent.
+  present(homeScreen, {
+      'datetime': formatted_datetime,
+      'cpu_temp': str(cpu_temp) + " ºC",
+      # CPU temperature trend of the last 10 minutes next to its value
+      'cpu_sparkline': sparkline_points(history.series('cpu_temp', 10*60, 30), CPU_SPARKLINE_BOX),
+      'ram': f"{used_ram:.0f} of {total_ram:.0f} MB Used",
+      'disk': f"{free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free",
+      'power': power_line,
+      'battery': "{:1.1f}%".format(p),
+  })
+
+#center button to display QR code:
+def show_qr():
+  global shownScreen
+  if not network_info['internal_ip']:
+    present(noNetworkScreen, {})
+    return
+  # username is the account running the dashboard, also without a terminal
+  url = "ssh://" + str(username) + "@" + network_info['internal_ip']
+  # The QR code only changes with the address, draw it once per visit
+  if shownScreen == url:
+    return
+  print("Center - Showing QR Code to Connect via WebSSH:")
+  print (url)
+  disp.set_buffer(qr_frame(url))
+  with instruments.time('transfer'):
+    disp.display()
+  shownScreen = url
 
+#now the arrow keys:
+def show_network():
+  #Interface, Int IP, Ext IP, throughput
+  if network_info['interface_name']:
+    rates = metrics.value('throughput', {}).get(network_info['interface_name'])
+    present(networkScreen, {
+        'interface_name': network_info['interface_name'],
+        'internal_ip': network_info['internal_ip'],
+        'user': username,
+        'external_ip': network_info['external_ip'],
+        'throughput': "-" if rates is None else f"{format_rate(rates[0])} / {format_rate(rates[1])} B/s",
+    })
+  else:
+    present(noNetworkScreen, {})
+
+def show_ups():
+  present(upsScreen, {
+      'bus_voltage': "{:1.2f} V".format(bus_voltage),
+      'current': "{:1.4f} A".format(current/1000),
+      'power': "{:1.3f} W".format(power),
+      # Power draw over the last 10 minutes
+      'power_sparkline': sparkline_points(history.series('power', 10*60, 40), POWER_SPARKLINE_BOX),
+      'percent': "{:1.1f}%".format(p),
+  })
+
+def show_room():
+  # Last good sensor readings, "-" until a sensor has answered
+  bmp280_reading = metrics.value('bmp280') or {}
+  dht22_reading = metrics.value('dht22') or {}
+  co2_reading = metrics.value('co2') or {}
+  # The BMP280 is the steadier thermometer, the DHT22 stands in for it
+  temperature = bmp280_reading.get('temperature', dht22_reading.get('temperature'))
+  humidity = dht22_reading.get('humidity')
+  pressure = bmp280_reading.get('pressure')
+  co2 = co2_reading.get('co2')
+  present(roomScreen, {
+      'temperature': "-" if temperature is None else "{:1.1f} ºC".format(temperature),
+      'humidity': "-" if humidity is None else "{:1.0f}%".format(humidity),
+      'pressure': "-" if pressure is None else "{:1.1f} hPa".format(pressure),
+      'co2': "-" if co2 is None else f"{co2} ppm",
+  })
+
+def show_surveillance():
+  present(surveillanceScreen, {
+      'disk': f"{free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free",
+  })
+
+def format_rate(rate):
   """
-  if free_space_gb is not None and total_capacity_gb is not None:
-    print(f"Free space: {free_space_gb:.2f} GB")
-    print(f"Total capacity: {total_capacity_gb:.2f} GB")
+  Returns:
+      str: Bytes per second, e.g. "850", "12.3k" or "1.2M".
+  """
+  if rate >= 1000000:
+    return "{:.1f}M".format(rate/1000000)
+  if rate >= 1000:
+    return "{:.1f}k".format(rate/1000)
+  return "{:.0f}".format(rate)
+
+#low battery warning, shown until the Pi powers off:
+def show_shutdown_warning():
+  global shownScreen
+  shownScreen = None
+  draw.rectangle((0,0,width,height), outline=0, fill=0)
+  headerGlyphs.draw(image, (x, top), ("WARNING:"))
+  headerGlyphs.draw(image, (x, top+15), ("Low Battery"))
+  headerGlyphs.draw(image, (x, top+30), ("Shutting down"))
+  disp.image(image)
+  disp.display()
+
+#hidden stats screen, long press on the center key:
+def format_ms(seconds):
+  if seconds is None:
+    return "-"
+  if seconds >= 1:
+    return "{:.1f} s".format(seconds)
+  return "{:.1f} ms".format(seconds*1000)
+
+def show_stats():
+  slowest = instruments.slowest()
+  present(statsScreen, {
+      'frame': format_ms(instruments.percentile('frame', 50)) + " / " + format_ms(instruments.percentile('frame', 99)),
+      'overruns': f"{instruments.overruns} of {instruments.frames}",
+      'transfer': format_ms(instruments.percentile('transfer', 99)),
+      # Worst p99 of any stage, e.g. "network 12.0 ms" for collect.network
+      'slowest': "-" if slowest is None else slowest[0].split('.')[-1] + " " + format_ms(slowest[1]),
+  })
+
+screens = {
+    'home': show_home,
+    'qr': show_qr,
+    'network': show_network,
+    'ups': show_ups,
+    'room': show_room,
+    'surveillance': show_surveillance,
+    'stats': show_stats,
+}
+# Detail screens go back home after SCREEN_TIMEOUT seconds without a key press
+SCREEN_TIMEOUT = 6
+navigator = ScreenNavigator('home', timeout=SCREEN_TIMEOUT)
+navigator.add('qr', 'center')
+navigator.add('network', 'left', refresh=2)
+navigator.add('ups', 'up', refresh=0.5)
+navigator.add('room', 'down', refresh=2)
+navigator.add('surveillance', 'right', refresh=5)
+navigator.add('stats', 'center', refresh=1, kind='long')
+# Metrics a detail screen re-collects on every refresh, e.g. live current draw
+# (the room sensors push their readings, the refresh only redraws them)
+liveMetrics = {'network': ['throughput'], 'ups': ['ups']}
+
+def screen_changed():
+  """
+  Re-arms the timeout and live refresh deadlines of the screen now showing.
+  """
+  scheduler.cancel('marquee')
+  if navigator.expires is None:
+    scheduler.cancel('screen_timeout')
   else:
-    print("Error: Could not determine disk usage.")
-  """  
-  
-  
-  #Getting Network Stats:
-  def get_network_info():
-    """
-    Gets information about the active network interface and its IP addresses.
-
-    Returns:
-        dict: A dictionary containing keys:
-            - interface_name (str): Name of the active interface (e.g., wlan0, eth0).
-            - internal_ip (str): Internal IP address on the active interface.
-            - external_ip (str): External IP address obtained from a free service.
-    """
-    # Get list of available interfaces
-    interfaces = ni.interfaces()
-    # Find the active interface (connected and not loopback)
-    active_interface = None
-    for interface in interfaces:
-      if ni.ifaddresses(interface)[ni.AF_INET] and not interface == 'lo':
-        active_interface = interface
-        break
-
-    if not active_interface:
-      return {'interface_name': None, 'internal_ip': None, 'external_ip': None}
-
-    # Get internal IP address
-    internal_ip = ni.ifaddresses(active_interface)[ni.AF_INET][0]['addr']
-
-    # Get external IP address using a free service (example using ipify.org)
-    external_ip = get_external_ip_from_service()
-
-    return {
-        'interface_name': active_interface,
-        'internal_ip': internal_ip,
-        'external_ip': external_ip
-    }
-
-  def get_external_ip_from_service():
-    """
-    Retrieves external IP address from a free service (example using ipify.org).
-
-    Returns:
-        str: External IP address, or None if an error occurs.
-    """
-    try:
-      url = "https://api.ipify.org?format=text"  # Free JSON format available
-      response = requests.get(url)
-      return response.text.strip()
-    except Exception as e:
-      print(f"Error getting external IP: {e}")
-      return None
-
-  # Get network information
-  network_info = get_network_info()
+    scheduler.at('screen_timeout', navigator.expires)
+  interval = navigator.refresh[navigator.current]
+  if interval is None:
+    scheduler.cancel('screen_refresh')
+  else:
+    scheduler.every('screen_refresh', interval)
+
+
+# Screens show the last run's values until the collectors have fresh ones
+metrics.restore(*snapshot.load_metrics())
+
+
+while True:
+  frameStarted = time.perf_counter()
+
+  #checking for joystick buttons being pressed:
+  # Key presses are queued by the input threads, none are lost while a
+  # screen is showing
+  for event in inputs.pending():
+    power_manager.activity()
+    if disp.asleep or event.key == wakeKey:
+      # The key that turns the panel back on does nothing else
+      disp.wake()
+      wakeKey = None if event.kind == 'release' else event.key
+      continue
+    if navigator.handle(event):
+      print(f"{event.key} - {navigator.current}")
+      screen_changed()
+
+  # Back to the home screen once a detail screen timed out
+  if scheduler.due('screen_timeout') and navigator.expired():
+    screen_changed()
+
+  # Detail screens re-collect their metrics at their own rate
+  if scheduler.due('screen_refresh'):
+    for name in liveMetrics.get(navigator.current, ()):
+      metrics.invalidate(name)
+    scheduler.after('metrics', 0)
+
+  # Refresh the metrics whose interval has elapsed
+  if scheduler.due('metrics'):
+    metrics.refresh()
+    upsReading = metrics.get('ups')
+    # Only fresh readings of this run pick the profile and may shut down
+    if upsReading.value is not None and not upsReading.stale and upsReading.timestamp != upsMeasured:
+      # Mains or battery, and the average draw measured in each
+      upsMeasured = upsReading.timestamp
+      profile = power_manager.update(upsReading.value)
+      if profile is not None:
+        apply_profile(profile)
+      metrics.publish('power_profile', {'profile': power_manager.profile.name,
+                                        'average_power': power_manager.average_power()})
+    scheduler.at('metrics', metrics.next_due())
+
+  # Turn the panel off once nobody used it for the profile's display timeout
+  idleAt = power_manager.display_idle_at()
+  if idleAt is None or disp.asleep or shuttingDown:
+    scheduler.cancel('display_idle')
+  else:
+    scheduler.at('display_idle', idleAt)
+  if scheduler.due('display_idle'):
+    disp.sleep()
+
+  # Latest cached values, collectors only run when they are due
+  cpu_temp = metrics.value('cpu_temp')
+  used_ram, total_ram = metrics.value('ram', (0, 0))
+  free_space_gb, total_capacity_gb = metrics.value('disk', (0, 0))
+  network_info = dict(metrics.value('network', {'interface_name': None, 'internal_ip': None}))
+  network_info['external_ip'] = metrics.value('external_ip')
+  ups = metrics.value('ups', {'bus_voltage': 0, 'shunt_voltage': 0, 'current': 0, 'power': 0, 'percent': 0})
+  bus_voltage = ups['bus_voltage']
+  shunt_voltage = ups['shunt_voltage']
+  current = ups['current']
+  power = ups['power']
+  p = ups['percent']
+
+  # Feed the trend history
+  if scheduler.due('history'):
+    history.record('cpu_temp', cpu_temp)
+    history.record('ram', used_ram)
+    history.record('disk', free_space_gb)
+    if metrics.get('ups').value is not None:
+      history.record('bus_voltage', bus_voltage)
+      history.record('current', current)
+      history.record('power', power)
+
+  # Wake up again when the clock minute ticks over
+  if scheduler.due('clock'):
+    scheduler.after('clock', seconds_to_next_minute())
   
   """
   if network_info['interface_name']:
@@ -406,231 +541,20 @@ while True:
   #disp.clear()
   #disp.display()
 
-  # Create blank image for drawing.
-  # Make sure to create image with mode '1' for 1-bit color.
-  width = disp.width
-  height = disp.height
-  image = Image.new('1', (width, height))
-
-  # Get drawing object to draw on image.
-  draw = ImageDraw.Draw(image)
-
-  # Draw a black filled box to clear the image.
-  draw.rectangle((0,0,width,height), outline=0, fill=0)
-
-  # Draw some shapes.
-  # First define some constants to allow easy resizing of shapes.
-  padding = 1
-  top = padding
-  x = padding
-  
-  # Load default font.
-  font = ImageFont.load_default()
-  headerFont = ImageFont.truetype('NimbusSanL-Bol.otf', 10.2)
-  textFont = ImageFont.truetype('NimbusSanL-Reg.otf', 10)
-
-  # Alternatively load a TTF font.  Make sure the .ttf font file is in the same directory as the python script!
-  # Some other nice fonts to try: http://www.dafont.com/bitmap.php
-  # Icons website: https://icons8.com/line-awesome
-  #font = ImageFont.truetype('PixelOperator.ttf', 16)
-  #icon_font= ImageFont.truetype('lineawesome-webfont.ttf', 18)
-  
-  # Clear display.
-  disp.clear()
-   
-  # Create an INA219 instance.
-  ina219 = INA219(addr=0x42)
-  bus_voltage = ina219.getBusVoltage_V()             # voltage on V- (load side)
-  shunt_voltage = ina219.getShuntVoltage_mV() / 1000 # voltage between V+ and V- across the shunt
-  current = ina219.getCurrent_mA()                   # current in mA
-  power = ina219.getPower_W()                        # power in W
-  p = (bus_voltage - 6)/2.4*100
-  if(p > 100):p = 100
-  if(p < 0):p = 0
-  
-  # Get current date and time
-  now = datetime.now()
-
-  # Format the date and time string
-  #formatted_datetime = now.strftime("%a|%b %d %Y|%H:%M")
-  formatted_datetime = now.strftime("%a | %b %d %Y | %H:%M")
-  
-  # Draw data on the image
-  draw.text((x, top), (formatted_datetime), font=headerFont, fill=255)
-  #draw.text((x, top), ("_______________________"), font=headerFont, fill=255)
-  draw.text((x, top+15), " CPU Temp: " + str(cpu_temp) + " ºC", font=textFont, fill=255)
-  draw.text((x, top+25), f" RAM: {used_ram:.0f} of {total_ram:.0f} MB Used", font=textFont, fill=255)
-  draw.text((x, top+35), f" Disk: {free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free", font=textFont, fill=255)
-  #draw.text((x, top+45), "# Power: {:1.3f} W".format(power), font=textFont, fill=255)
-  if current < 0:
-    draw.text((x, top+45), " Power: {:1.3f} W".format(power), font=textFont, fill=255)
-  elif current >0:
-    draw.text((x, top+45), " Charging at {:1.4f} A".format(current/1000), font=textFont, fill=255)
-  draw.text((x, top+55), " Battery: {:1.1f}%".format(p), font=textFont, fill=255)
-  # Display image.
-  disp.image(image)
-  disp.display()
-  
-  #additional clear display image:
-  #blankImage = Image.new('1', (128, 64))  # Create a new black image
-  #cleaning the display
-  #draw = ImageDraw.Draw(blankImage)
-  
-  #checking for joystick buttons being pressed:
-  
-  #center button to display QR code:
-  username = os.getlogin()
-  KEY = 20
-  GPIO.setmode(GPIO.BCM)
-  GPIO.setup(KEY,GPIO.IN,GPIO.PUD_UP)
-  
-  if GPIO.input(KEY) == 0:
-    while GPIO.input(KEY) == 0:
-      time.sleep(0.01)
-      print("Center - Showing QR Code to Connect via WebSSH:")
-
-      draw.rectangle((0,0,width,height), outline=0, fill=0)      
-
-      url = "ssh://" + str(username) + "@" + "192.168.81.99"  # Replace with your desired URL
-      print (url)
-
-      # Create the QR code
-      qr = qrcode.QRCode(
-          version=1,  # Adjust version for longer URLs if needed
-          box_size=1,
-          border=0  # Remove border for cleaner appearance
-      )
-      qr.add_data(url)
-      qr.make(fit=True)
-
-      # Generate a white QR code image
-      qr_img = qr.make_image(fill_color="white", back_color="black")
-
-      # Resize to 64x64 pixels
-      qr_img = qr_img.resize((64, 64), Image.LANCZOS)
-
-      # Create a blank image for the display
-      oled_img = Image.new("1", (128, 64), color=0)  # 1-bit mode for OLED compatibility
-
-      # Calculate center coordinates
-      x_center = (oled_img.width - qr_img.width) // 2
-      y_center = (oled_img.height - qr_img.height) // 2
-
-      # Paste QR code onto the display image
-      oled_img.paste(qr_img, (x_center, y_center))
-
-      disp.image(oled_img)
-      disp.display()
-      time.sleep(6)
-
-              
-  
-  #now checking for arrow keys:
-  address = 0x20
-  bus = smbus.SMBus(1)
-  bus.write_byte(address,0x0F|bus.read_byte(address))
-  value = bus.read_byte(address) | 0xF0
-  
-  while value != 0xFF:
-    if (value | 0xFE) != 0xFF:
-      print("left - Network")
-      #Interface, Int IP, Ext IP
-      draw.rectangle((0,0,width,height), outline=0, fill=0)
-      draw.text((x, top), ("Network Stats:"), font=headerFont, fill=255)
-      #draw.text((x, top+1), "________", font=textFont, fill=255)
-      if network_info['interface_name']:
-        draw.text((x, top+15), f" Interface: {network_info['interface_name']}", font=textFont, fill=255)
-        draw.text((x, top+27), f" Int IP: {network_info['internal_ip']}", font=textFont, fill=255)
-        draw.text((x, top+39), f" User: {username}", font=textFont, fill=255)
-        draw.text((x, top+51), f" Ext IP: {network_info['external_ip']}", font=textFont, fill=255)
-      else:
-        draw.text((x, top+27), "No active ", font=textFont, fill=255)
-        draw.text((x, top+37), "network interface", font=textFont, fill=255)
-        draw.text((x, top+47), "found", font=textFont, fill=255)
-      disp.image(image)
-      disp.display()
-      time.sleep(6)
-      bus.write_byte(address,0x0F|bus.read_byte(address))
-      value = bus.read_byte(address) | 0xF0
-      time.sleep(0.1)
-      
-    elif (value | 0xFD) != 0xFF:
-      print("up - UPS Stats")
-      draw.rectangle((0,0,width,height), outline=0, fill=0)
-      draw.text((x, top), ("UPS Stats:"), font=headerFont, fill=255)
-      #draw.text((x, top+1), "__________", font=textFont, fill=255)
-      draw.text((x, top+15), " Load Voltage: {:1.2f} V".format(bus_voltage), font=textFont, fill=255)
-      draw.text((x, top+27), " Current: {:1.4f} A".format(current/1000), font=textFont, fill=255)
-      draw.text((x, top+39), " Power: {:1.3f} W".format(power), font=textFont, fill=255)
-      draw.text((x, top+51), " Percent: {:1.1f}%".format(p), font=textFont, fill=255)
-      disp.image(image)
-      disp.display()
-      time.sleep(6)
-      bus.write_byte(address,0x0F|bus.read_byte(address))
-      value = bus.read_byte(address) | 0xF0
-      time.sleep(0.1)
-      
-    elif (value | 0xFB) != 0xFF:
-      print("down - Room Conditions:")
-      draw.rectangle((0,0,width,height), outline=0, fill=0)
-      draw.text((x, top), ("Room Conditions:"), font=headerFont, fill=255)
-      #draw.text((x, top+1), "________", font=textFont, fill=255)
-      draw.text((x, top+15), " Temp: 24 ºС", font=textFont, fill=255)
-      draw.text((x, top+27), " Hum: 36%", font=textFont, fill=255)
-      draw.text((x, top+39), " Pressure: 1 hPa", font=textFont, fill=255)
-      draw.text((x, top+51), " CO2: 37%", font=textFont, fill=255)
-      disp.image(image)
-      disp.display()
-      time.sleep(6)
-      bus.write_byte(address,0x0F|bus.read_byte(address))
-      value = bus.read_byte(address) | 0xF0
-      time.sleep(0.1)
-      
-    elif (value | 0xFF) == 0xFF:
-      print("right - Motion")
-      draw.rectangle((0,0,width,height), outline=0, fill=0)      
-      draw.text((x, top), ("Surveillance:"), font=headerFont, fill=255)
-      #draw.text((x, top+1), "________", font=textFont, fill=255)
-      draw.text((x, top+15), " Status: ON", font=textFont, fill=255)
-      draw.text((x, top+30), " Storage: SD/USB", font=textFont, fill=255)
-      draw.text((x, top+45), f" Disk: {free_space_gb:.0f} of {total_capacity_gb:.0f} GB Free", font=textFont, fill=255)
-      #draw.text((x, top+45), "***: ", font=textFont, fill=255)
-      disp.image(image)
-      disp.display()
-      time.sleep(6)
-      bus.write_byte(address,0x0F|bus.read_byte(address))
-      value = bus.read_byte(address) | 0xF0
-      time.sleep(0.1)
-      
-      
-   
   #checking for battery level to initiate safe shutdown below 10%:
-  if p < 10 and current < 0:
-    beepAddress = 0x20
-    def beep_on():
-      bus.write_byte(address,0x7F&bus.read_byte(beepAddress))
-    def beep_off():
-      bus.write_byte(address,0x80|bus.read_byte(beepAddress))
-    def led_off():
-      bus.write_byte(address,0x10|bus.read_byte(address))
-    def led_on():
-      bus.write_byte(address,0xEF&bus.read_byte(address))
-                     
-    draw.rectangle((0,0,width,height), outline=0, fill=0)  
-    draw.text((x, top), ("WARNING:"), font=headerFont, fill=255)
-    draw.text((x, top+15), ("Low Battery"), font=headerFont, fill=255)
-    draw.text((x, top+30), ("Shutting down"), font=headerFont, fill=255)
-    disp.image(image)
-    disp.display()
-    for i in range(1, 4):
-      beep_on()
-      led_on()
-      time.sleep(0.1)
-      beep_off()
-      led_off()
-      time.sleep(0.1)
-    time.sleep(6)
+  # One-shot: the warning stays up and the loop keeps running until the
+  # 'shutdown' deadline powers the Pi off
+  if not shuttingDown and power_manager.shutdown_due():
+    shuttingDown = True
+    # Beep and blink three times from the expander's timer while the warning shows
+    expander.play(BEEP_3X)
+    disp.wake()
+    show_shutdown_warning()
+    scheduler.after('shutdown', SHUTDOWN_DELAY)
+  if scheduler.due('shutdown'):
     exit_status = os.system("sudo poweroff")
+    if exit_status != 0:
+      print(f"Error shutting down: poweroff exited with {exit_status}")
     #elif value != 0xFF:
     #  if (value | 0xFE) != 0xFF:
     #    print("left")
@@ -647,5 +571,40 @@ while True:
     # bus.write_byte(address,0x0F|bus.read_byte(address))
     # value = bus.read_byte(address) | 0xF0
     #draw = ImageDraw.Draw(image)
+
+  # Draw the screen that is showing; values that did not change cost nothing.
+  # Nothing is drawn or sent while the panel is off or the warning shows.
+  if not disp.asleep and not shuttingDown:
+    screens[navigator.current]()
+    if 'live_frame' not in startupTimes:
+      startupTimes['live_frame'] = round(process_age(), 3)
+      print(f"First live frame after {startupTimes['live_frame']*1000:.0f} ms")
+  
+  #additional clear display image:
+  #blankImage = Image.new('1', (128, 64))  # Create a new black image
+  #cleaning the display
+  #draw = ImageDraw.Draw(blankImage)
+  
+
+  # Keep the home screen and the metrics for the next start
+  if scheduler.due('snapshot'):
+    try:
+      onHome = navigator.current == 'home' and not (disp.asleep or shuttingDown)
+      snapshot.save(disp.get_buffer() if onHome else None, metrics.snapshot())
+    except (OSError, TypeError, ValueError) as e:
+      print(f"Error saving snapshot: {e}")
+    scheduler.after('snapshot', SNAPSHOT_INTERVAL)
+
+  # Time the pass and dump the stats now and then
+  instruments.frame(time.perf_counter() - frameStarted, scheduler.frame_interval)
+  if scheduler.due('stats'):
+    try:
+      # With the transaction and error counts of every I2C device
+      instruments.write(STATS_FILE, {'i2c': i2c.device_stats(), 'startup': startupTimes})
+    except OSError as e:
+      print(f"Error writing stats: {e}")
+
+  # Sleep until the next deadline or key event instead of spinning
+  scheduler.sleep()
                 
                 
@@ -0,0 +1,112 @@
+import time
+from collections import namedtuple
+
+
+# How hard the dashboard works on a power source: loop frame rate, factor on
+# the metric refresh intervals, INA219 samples per second, whether the panel
+# is dimmed and after how many idle seconds it turns off (None: never)
+Profile = namedtuple('Profile', ['name', 'frame_rate', 'interval_scale', 'ups_rate', 'dim', 'display_timeout'])
+
+MAINS = Profile('mains', frame_rate=30, interval_scale=1, ups_rate=5, dim=False, display_timeout=None)
+BATTERY = Profile('battery', frame_rate=5, interval_scale=4, ups_rate=1, dim=True, display_timeout=60)
+
+
+class PowerManager:
+    """
+    Picks the operating profile from the UPS state and keeps track of how
+    much power the Pi draws in each one.
+
+    The UPS HAT runs on battery while the INA219 current is below threshold
+    (negative is discharging). A new power source has to hold for settle
+    seconds before the profile changes, so noise around zero doesn't make
+    it flap; below low_percent the battery profile applies right away.
+
+    Power readings are integrated per profile, so average_power() reports
+    what the battery profile actually saves, as measured by the INA219.
+
+    Only feed update() readings taken by this run: shutdown_due() trusts
+    the last one it was given.
+    """
+
+    def __init__(self, mains=MAINS, battery=BATTERY, threshold=-50, settle=10, low_percent=30,
+                 shutdown_percent=10, clock=time.monotonic):
+        self.mains = mains
+        self.battery = battery
+        self.threshold = threshold
+        self.settle = settle
+        self.low_percent = low_percent
+        self.shutdown_percent = shutdown_percent
+        self._clock = clock
+        self.profile = mains
+        self.last_activity = clock()
+        self._candidate = None
+        self._since = None
+        self._measured = None
+        self._ups = None
+        # profile name -> [joules, seconds]
+        self._energy = {}
+
+    def update(self, ups):
+        """
+        Feeds the latest UPS averages (INA219Sampler.average()).
+
+        Returns:
+            Profile: The new profile if it changed, else None.
+        """
+        now = self._clock()
+        self._ups = ups
+        self._account(ups['power'], now)
+        on_battery = ups['current'] < self.threshold
+        wanted = self.battery if on_battery else self.mains
+        if wanted is self.profile:
+            self._candidate = None
+            return None
+        if wanted is not self._candidate:
+            self._candidate = wanted
+            self._since = now
+        if now - self._since < self.settle and not (on_battery and ups['percent'] < self.low_percent):
+            return None
+        self.profile = wanted
+        self._candidate = None
+        # The display timeout counts from the switch, not from the last key
+        self.last_activity = now
+        return wanted
+
+    def shutdown_due(self):
+        """
+        Returns:
+            bool: True if the last reading given to update() shows the
+                  battery discharging below shutdown_percent.
+        """
+        ups = self._ups
+        return ups is not None and ups['percent'] < self.shutdown_percent and ups['current'] < 0
+
+    def _account(self, power, now):
+        if self._measured is not None:
+            elapsed = now - self._measured
+            energy = self._energy.setdefault(self.profile.name, [0.0, 0.0])
+            energy[0] += power * elapsed
+            energy[1] += elapsed
+        self._measured = now
+
+    def activity(self):
+        """
+        Records a key press, restarting the display timeout.
+        """
+        self.last_activity = self._clock()
+
+    def display_idle_at(self):
+        """
+        Returns:
+            float: Monotonic time the display should turn off, None if never.
+        """
+        if self.profile.display_timeout is None:
+            return None
+        return self.last_activity + self.profile.display_timeout
+
+    def average_power(self):
+        """
+        Returns:
+            dict: Average power in W drawn in each profile so far, by name.
+        """
+        return {name: joules / seconds for name, (joules, seconds) in self._energy.items() if seconds > 0}
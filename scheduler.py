@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+class RenderScheduler:
+    """
+    Frame-rate capped scheduler for the dashboard main loop.
+
+    Work is driven by named deadlines instead of a busy loop: the loop asks
+    due(name) to find out what needs doing and sleep() to block until the
+    next deadline (or until another thread calls wake()).
+    """
+
+    def __init__(self, max_fps=10, clock=time.monotonic):
+        self.frame_interval = 1.0 / max_fps
+        self._clock = clock
+        self._deadlines = {}
+        self._intervals = {}
+        self._last_wake = None
+        self._wakeup = threading.Event()
+
+    def every(self, name, interval):
+        """
+        Registers a periodic deadline. It is due right away and then every
+        interval seconds.
+        """
+        self._intervals[name] = interval
+        self._deadlines[name] = self._clock()
+
+    def at(self, name, when):
+        """
+        Schedules a one-shot deadline at monotonic time when.
+        """
+        self._intervals.pop(name, None)
+        self._deadlines[name] = when
+
+    def after(self, name, delay):
+        """
+        Schedules a one-shot deadline delay seconds from now.
+        """
+        self.at(name, self._clock() + delay)
+
+    def cancel(self, name):
+        """
+        Removes a deadline, periodic or not.
+        """
+        self._intervals.pop(name, None)
+        self._deadlines.pop(name, None)
+
+    def pending(self, name):
+        """
+        Returns:
+            bool: True if a deadline is set under name.
+        """
+        return name in self._deadlines
+
+    def due(self, name):
+        """
+        Checks whether a deadline has passed.
+
+        Returns:
+            bool: True if it is due. Periodic deadlines are re-armed,
+                  one-shot deadlines are removed.
+        """
+        deadline = self._deadlines.get(name)
+        now = self._clock()
+        if deadline is None or now < deadline:
+            return False
+        interval = self._intervals.get(name)
+        if interval is None:
+            del self._deadlines[name]
+        else:
+            # Skip missed periods instead of firing them back to back
+            deadline += interval
+            self._deadlines[name] = deadline if deadline > now else now + interval
+        return True
+
+    def wake(self):
+        """
+        Ends the current sleep() early. Safe to call from other threads.
+        """
+        self._wakeup.set()
+
+    def next_deadline(self):
+        """
+        Returns:
+            float: Monotonic time of the earliest deadline, or None.
+        """
+        return min(self._deadlines.values()) if self._deadlines else None
+
+    def sleep(self):
+        """
+        Blocks until the earliest deadline, but never returns sooner than one
+        frame interval after the previous wake-up, which caps the loop rate.
+        """
+        now = self._clock()
+        wake_at = self.next_deadline()
+        if self._last_wake is not None:
+            earliest = self._last_wake + self.frame_interval
+            if wake_at is None or wake_at < earliest:
+                wake_at = earliest
+        if wake_at is None or wake_at > now:
+            self._wakeup.wait(None if wake_at is None else wake_at - now)
+        self._wakeup.clear()
+        self._last_wake = self._clock()
@@ -0,0 +1,220 @@
+import time
+
+from PIL import Image
+from PIL import ImageDraw
+
+
+class ScreenTemplate:
+    """
+    A screen whose static chrome (title, labels) is rendered once into a base
+    frame. Dynamic values live in reserved field boxes; update() only redraws
+    the fields whose value changed, everything else costs nothing.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.base = Image.new('1', size)
+        self.image = self.base.copy()
+        self._base_draw = ImageDraw.Draw(self.base)
+        self._draw = ImageDraw.Draw(self.image)
+        # name -> (box, glyphs or render function, background crop)
+        self._fields = {}
+        self._values = {}
+        # Marquee text fields -> scroll offset in pixels
+        self._offsets = {}
+        # Blank pixels between the end of a scrolling value and its repeat
+        self.marquee_gap = 16
+        # Rows [y0, y1) redrawn since the last take_dirty_rows(), None if none
+        self._dirty_rows = None
+
+    def label(self, xy, text, glyphs):
+        """
+        Draws static text into the base frame.
+
+        Returns:
+            int: x coordinate right after the text, where a value can start.
+        """
+        glyphs.draw(self.base, xy, text)
+        self.image = self.base.copy()
+        self._draw = ImageDraw.Draw(self.image)
+        return int(xy[0] + glyphs.font.getlength(text))
+
+    def field(self, name, box, glyphs=None, render=None):
+        """
+        Reserves box (x0, y0, x1, y1) for a dynamic value.
+
+        Args:
+            glyphs: GlyphFont to draw text values with, or
+            render: Function (draw, box, value) drawing any other value.
+        """
+        self._fields[name] = (box, glyphs, render)
+
+    def text_field(self, name, xy, glyphs, label='', end=None, height=None, marquee=False):
+        """
+        Reserves a text value from xy, after an optional static label, to
+        column end (default: the end of the row). Pass the row pitch as height
+        when rows are closer together than the font height, so that fields
+        don't overlap. With marquee, values too wide for the field scroll
+        through it on advance() instead of being cut off.
+        """
+        x = self.label(xy, label, glyphs) if label else int(xy[0])
+        end = self.size[0] if end is None else end
+        height = glyphs.height if height is None else height
+        self.field(name, (x, int(xy[1]), end, int(xy[1]) + height), glyphs)
+        if marquee:
+            self._offsets[name] = 0
+
+    def update(self, values):
+        """
+        Draws the fields whose value differs from the last update().
+
+        Returns:
+            bool: True if anything was redrawn.
+        """
+        changed = False
+        for name, value in values.items():
+            if name in self._values and self._values[name] == value:
+                continue
+            self._values[name] = value
+            box, glyphs, render = self._fields[name]
+            if name in self._offsets:
+                # A new value starts scrolling from its beginning
+                self._offsets[name] = 0
+                self._draw_marquee(name)
+                changed = True
+                continue
+            # Restore the chrome under the field, then draw the new value
+            self.image.paste(self.base.crop(box), box[:2])
+            if render is not None:
+                render(self._draw, box, value)
+            elif value:
+                glyphs.draw(self.image, box[:2], str(value))
+            self._mark(box)
+            changed = True
+        return changed
+
+    def _mark(self, box):
+        rows = self._dirty_rows
+        y0, y1 = box[1], box[3]
+        self._dirty_rows = (y0, y1) if rows is None else (min(rows[0], y0), max(rows[1], y1))
+
+    def take_dirty_rows(self):
+        """
+        Returns:
+            tuple: (y0, y1) spanning every field redrawn since the last call,
+                   None if nothing was. The span is reset.
+        """
+        rows = self._dirty_rows
+        self._dirty_rows = None
+        return rows
+
+    def _overflow(self, name):
+        """
+        Returns:
+            int: Scroll period in pixels of a marquee field whose value is too
+                 wide for it, 0 if the value fits.
+        """
+        value = self._values.get(name)
+        if not value:
+            return 0
+        box, glyphs, _ = self._fields[name]
+        width = glyphs.render(str(value)).width
+        return width + self.marquee_gap if width > box[2] - box[0] else 0
+
+    def _draw_marquee(self, name):
+        box, glyphs, _ = self._fields[name]
+        field = self.base.crop(box)
+        value = self._values.get(name)
+        if value:
+            strip = glyphs.render(str(value))
+            offset = self._offsets[name]
+            field.paste(255, (-offset, 0), strip)
+            period = self._overflow(name)
+            if period:
+                # The start of the value follows the gap after its end
+                field.paste(255, (period - offset, 0), strip)
+        self.image.paste(field, box[:2])
+        self._mark(box)
+
+    def overflowing(self):
+        """
+        Returns:
+            bool: True if a marquee field holds a value that needs scrolling.
+        """
+        return any(self._overflow(name) for name in self._offsets)
+
+    def advance(self, pixels=1):
+        """
+        Scrolls the values that don't fit their marquee fields by pixels.
+
+        Returns:
+            bool: True if anything was redrawn.
+        """
+        changed = False
+        for name in self._offsets:
+            period = self._overflow(name)
+            if period:
+                self._offsets[name] = (self._offsets[name] + pixels) % period
+                self._draw_marquee(name)
+                changed = True
+        return changed
+
+
+class ScreenNavigator:
+    """
+    State machine deciding which screen is showing.
+
+    The home screen shows by default. A key press (or long press) opens the
+    screen bound to it, pressing it again (or letting timeout seconds pass without a
+    press) returns home. Nothing here blocks, the main loop just renders
+    whatever current is on every pass.
+    """
+
+    def __init__(self, home='home', timeout=6, clock=time.monotonic):
+        self.home = home
+        self.timeout = timeout
+        self._clock = clock
+        self._keys = {}
+        # name -> seconds between live refreshes, None for event-driven redraws
+        self.refresh = {home: None}
+        self.current = home
+        # Monotonic time at which the current screen returns home, None on home
+        self.expires = None
+
+    def add(self, name, key, refresh=None, kind='press'):
+        """
+        Binds a screen to a key event kind ('press' or 'long' for a long
+        press), optionally redrawn every refresh seconds while it shows.
+        """
+        self._keys[(key, kind)] = name
+        self.refresh[name] = refresh
+
+    def show(self, name):
+        self.current = name
+        self.expires = None if name == self.home else self._clock() + self.timeout
+
+    def handle(self, event):
+        """
+        Applies a KeyEvent.
+
+        Returns:
+            bool: True if another screen is now showing.
+        """
+        name = self._keys.get((event.key, event.kind))
+        if name is None:
+            return False
+        previous = self.current
+        self.show(self.home if name == previous else name)
+        return self.current != previous
+
+    def expired(self):
+        """
+        Returns home once the current screen timed out.
+
+        Returns:
+            bool: True if it did.
+        """
+        if self.expires is not None and self._clock() >= self.expires:
+            self.show(self.home)
+            return True
+        return False
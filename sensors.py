@@ -0,0 +1,201 @@
+import random
+import threading
+import time
+
+import hal
+from i2cbus import BusioI2C, shared_bus
+
+
+# GPIO (BCM) the DHT22 data line is wired to
+DHT22_PIN = 4
+# I2C address of the BMP280 breakout (0x77 with SDO pulled high)
+BMP280_ADDRESS = 0x76
+# UART of the MH-Z19 CO2 meter
+MHZ19_PORT = '/dev/serial0'
+
+
+class SensorPoller:
+    """
+    Reads one sensor from its own thread at a rate suited to it.
+
+    Good readings are kept as the last good value and handed to on_update
+    (e.g. CollectorRegistry.publish); failed reads are retried a few times
+    and counted, but never block the caller. The backend is opened lazily
+    in the thread, so a slow driver import or a missing sensor doesn't
+    delay the dashboard either.
+    """
+
+    def __init__(self, name, open_backend, interval, retries=0, retry_delay=2.0,
+                 max_backoff=5*60, on_update=None, stats=None):
+        self.name = name
+        self.open_backend = open_backend
+        self.interval = interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.on_update = on_update
+        self.stats = stats
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.timestamp = None
+        self._value = None
+        self._backend = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'sensor-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self):
+        """
+        Returns:
+            dict: Last good reading, or None if the sensor never answered.
+        """
+        return self._value
+
+    def _failed(self, error):
+        self.errors += 1
+        self.consecutive_errors += 1
+        self.last_error = str(error)
+
+    def read(self):
+        """
+        Reads the sensor once, retrying up to retries times.
+
+        Returns:
+            dict: The reading, or None if every attempt failed.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt and self._stopped.wait(self.retry_delay):
+                return None
+            try:
+                if self._backend is None:
+                    self._backend = self.open_backend()
+                started = time.perf_counter()
+                value = self._backend.read()
+                if self.stats is not None:
+                    self.stats.record(f'sensor.{self.name}', time.perf_counter() - started)
+                return value
+            except (OSError, RuntimeError, ValueError, ImportError) as e:
+                self._failed(e)
+                if isinstance(e, (OSError, ImportError)):
+                    # Missing hardware or driver: reopen next time, no quick retries
+                    self._backend = None
+                    return None
+        return None
+
+    def _run(self):
+        failed_reads = 0
+        while not self._stopped.is_set():
+            value = self.read()
+            if value is None:
+                # Back off while the sensor keeps failing
+                failed_reads += 1
+                delay = min(self.interval * 2 ** min(failed_reads - 1, 8), self.max_backoff)
+                if failed_reads == 1:
+                    print(f"Error reading {self.name}: {self.last_error}")
+            else:
+                failed_reads = 0
+                self.consecutive_errors = 0
+                self._value = value
+                self.timestamp = time.monotonic()
+                if self.on_update is not None:
+                    self.on_update(value)
+                delay = self.interval
+            self._stopped.wait(delay)
+
+
+#BMP280 (temperature and pressure, I2C):
+class BMP280Backend:
+    def __init__(self, address=BMP280_ADDRESS):
+        import adafruit_bmp280
+        # On the shared bus, not a second handle from busio
+        shared_bus(1).name(address, 'bmp280')
+        self.sensor = adafruit_bmp280.Adafruit_BMP280_I2C(BusioI2C(shared_bus(1)), address=address)
+
+    def read(self):
+        return {'temperature': round(self.sensor.temperature, 2),
+                'pressure': round(self.sensor.pressure, 2)}
+
+
+class SimulatedBMP280:
+    def __init__(self, temperature=22.5, pressure=1013.2):
+        self.temperature = temperature
+        self.pressure = pressure
+
+    def read(self):
+        return {'temperature': round(self.temperature + random.uniform(-0.1, 0.1), 2),
+                'pressure': round(self.pressure + random.uniform(-0.2, 0.2), 2)}
+
+
+#DHT22 (temperature and humidity, bit-banged single wire):
+class DHT22Backend:
+    def __init__(self, pin=DHT22_PIN):
+        import board
+        import adafruit_dht
+        self.sensor = adafruit_dht.DHT22(getattr(board, f'D{pin}'), use_pulseio=False)
+
+    def read(self):
+        # Raises RuntimeError on the frequent checksum and timing failures
+        humidity = self.sensor.humidity
+        temperature = self.sensor.temperature
+        if humidity is None or temperature is None:
+            raise RuntimeError('DHT22 returned no data')
+        return {'temperature': temperature, 'humidity': humidity}
+
+
+class SimulatedDHT22:
+    def __init__(self, temperature=22.0, humidity=40.0, failure_rate=0.3):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.failure_rate = failure_rate
+
+    def read(self):
+        # Like the real sensor, a good share of reads fail
+        if random.random() < self.failure_rate:
+            raise RuntimeError('Checksum did not validate. Try again.')
+        return {'temperature': round(self.temperature + random.uniform(-0.2, 0.2), 1),
+                'humidity': round(self.humidity + random.uniform(-1, 1), 1)}
+
+
+#MH-Z19 CO2 meter (UART):
+class MHZ19Backend:
+    READ_CO2 = bytes([0xFF, 0x01, 0x86, 0x00, 0x00, 0x00, 0x00, 0x00, 0x79])
+
+    def __init__(self, port=MHZ19_PORT):
+        import serial
+        self.serial = serial.Serial(port, 9600, timeout=1)
+
+    def read(self):
+        self.serial.reset_input_buffer()
+        self.serial.write(self.READ_CO2)
+        response = self.serial.read(9)
+        if len(response) != 9 or response[0] != 0xFF or response[1] != 0x86:
+            raise RuntimeError('No answer from MH-Z19')
+        if (0xFF - sum(response[1:8]) % 256 + 1) % 256 != response[8]:
+            raise RuntimeError('MH-Z19 checksum mismatch')
+        return {'co2': response[2] * 256 + response[3]}
+
+
+class SimulatedMHZ19:
+    def __init__(self, co2=650):
+        self.co2 = co2
+
+    def read(self):
+        return {'co2': self.co2 + random.randint(-15, 15)}
+
+
+def backend(real, simulated):
+    """
+    Returns:
+        The simulated backend when the hardware layer is simulated, else real.
+    """
+    return simulated if hal.BACKEND == 'sim' else real
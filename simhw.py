@@ -0,0 +1,560 @@
+import threading
+import time
+
+from PIL import Image
+
+
+class BusStats:
+    """
+    Traffic counters of one simulated device.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def as_dict(self):
+        return {'transactions': self.transactions,
+                'bytes_written': self.bytes_written,
+                'bytes_read': self.bytes_read}
+
+
+class SimGPIO:
+    """
+    Stand-in for the RPi.GPIO module.
+
+    Inputs are driven with set_input() or script(); edge callbacks registered
+    with add_event_detect() run in the thread that changes the level.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.levels = {}
+        self.reads = 0
+        self.writes = 0
+        self.edges = 0
+        # pin -> (edge, callback)
+        self._detect = {}
+        # pin -> functions called with the new level of an output
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        if direction == self.IN:
+            # Idle level set by the pull resistor
+            self.levels.setdefault(pin, 0 if pull_up_down == self.PUD_DOWN else 1)
+        else:
+            self.levels[pin] = initial if initial is not None else self.levels.get(pin, 0)
+
+    def input(self, pin):
+        self.reads += 1
+        return self.levels.get(pin, 1)
+
+    def output(self, pin, level):
+        self.writes += 1
+        self.levels[pin] = 1 if level else 0
+        for listener in self._listeners.get(pin, ()):
+            listener(self.levels[pin])
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._detect[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self._detect.pop(pin, None)
+
+    def cleanup(self, pin=None):
+        if pin is None:
+            self._detect.clear()
+        else:
+            self._detect.pop(pin, None)
+
+    def listen(self, pin, listener):
+        """
+        Calls listener(level) whenever the program drives an output pin.
+        """
+        self._listeners.setdefault(pin, []).append(listener)
+
+    def set_input(self, pin, level):
+        """
+        Changes the level seen on an input pin, firing edge callbacks.
+        """
+        level = 1 if level else 0
+        with self._lock:
+            previous = self.levels.get(pin, 1)
+            self.levels[pin] = level
+        if previous == level:
+            return
+        self.edges += 1
+        edge, callback = self._detect.get(pin, (None, None))
+        if callback is None:
+            return
+        if edge == self.BOTH or edge == (self.FALLING if level == 0 else self.RISING):
+            callback(pin)
+
+    def script(self, pin, steps):
+        """
+        Plays input changes from a background thread.
+
+        Args:
+            steps: (seconds to wait, level) pairs, e.g. [(0.5, 0), (1.5, 1)]
+                   for a one and a half second press half a second from now.
+
+        Returns:
+            Thread: The player thread, join() it to wait for the script to end.
+        """
+        def play():
+            for delay, level in steps:
+                time.sleep(delay)
+                self.set_input(pin, level)
+        thread = threading.Thread(target=play, name=f'gpio-script-{pin}', daemon=True)
+        thread.start()
+        return thread
+
+
+class SSD1306Model:
+    """
+    SSD1306 controller behind the SPI bus: decodes the command stream
+    (the D/C pin tells commands from data) into display state and writes
+    data bytes into a virtual 128x64 display RAM.
+
+    A horizontal scroll rotates the scrolled pages of the RAM by one column
+    every few frames, as on the chip, where the RAM has to be rewritten once
+    the scroll is stopped. Frames pass when a test calls tick().
+    """
+
+    # Argument bytes that follow each multi-byte command
+    ARGUMENTS = {
+        0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5,
+        0x81: 1, 0x8D: 1, 0xA3: 2, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1,
+        0xDA: 1, 0xDB: 1,
+    }
+    # Horizontal scroll interval code -> frames per step
+    SCROLL_FRAMES = {0: 5, 1: 64, 2: 128, 3: 256, 4: 3, 5: 4, 6: 25, 7: 2}
+
+    def __init__(self, gpio, dc, rst, width=128, height=64):
+        self.gpio = gpio
+        self.dc = dc
+        self.width = width
+        self.pages = height // 8
+        self.stats = BusStats()
+        self.command_bytes = 0
+        self.data_bytes = 0
+        gpio.listen(rst, self._reset_pin)
+        self.reset()
+
+    def reset(self):
+        self.ram = bytearray(self.width * self.pages)
+        self.display_on = False
+        self.contrast = 0x7F
+        self.inverted = False
+        self.memory_mode = 2
+        self.start_line = 0
+        self.scrolling = False
+        self.scroll_setup = None
+        self.scroll_frames = 0
+        # Data bytes written while a scroll was running, their place is undefined
+        self.writes_while_scrolling = 0
+        self.column_window = (0, self.width - 1)
+        self.page_window = (0, self.pages - 1)
+        self.column = 0
+        self.page = 0
+        self._pending = []
+
+    def _reset_pin(self, level):
+        if level == 0:
+            self.reset()
+
+    def transfer(self, data):
+        """
+        Handles one SPI transfer.
+        """
+        self.stats.transactions += 1
+        self.stats.bytes_written += len(data)
+        if self.gpio.levels.get(self.dc, 0):
+            self.data_bytes += len(data)
+            for byte in data:
+                self._write_ram(byte)
+        else:
+            self.command_bytes += len(data)
+            for byte in data:
+                self._command_byte(byte)
+
+    def _command_byte(self, byte):
+        pending = self._pending
+        pending.append(byte)
+        if len(pending) <= self.ARGUMENTS.get(pending[0], 0):
+            return
+        self._pending = []
+        self._execute(pending[0], pending[1:])
+
+    def _execute(self, command, args):
+        if command == 0xAE or command == 0xAF:
+            self.display_on = command == 0xAF
+        elif command == 0x81:
+            self.contrast = args[0]
+        elif command == 0xA6 or command == 0xA7:
+            self.inverted = command == 0xA7
+        elif command == 0x20:
+            self.memory_mode = args[0] & 0x03
+        elif command == 0x21:
+            self.column_window = (args[0] & 0x7F, args[1] & 0x7F)
+            self.column = self.column_window[0]
+        elif command == 0x22:
+            self.page_window = (args[0] & 0x07, args[1] & 0x07)
+            self.page = self.page_window[0]
+        elif 0xB0 <= command <= 0xB7:
+            self.page = command & 0x07
+        elif command <= 0x0F:
+            self.column = (self.column & 0xF0) | command
+        elif command <= 0x1F:
+            self.column = (self.column & 0x0F) | (command & 0x0F) << 4
+        elif 0x40 <= command <= 0x7F:
+            self.start_line = command & 0x3F
+        elif command in (0x26, 0x27, 0x29, 0x2A):
+            self.scroll_setup = (command, tuple(args))
+        elif command == 0x2F:
+            self.scrolling = True
+            self.scroll_frames = 0
+        elif command == 0x2E:
+            self.scrolling = False
+
+    def tick(self, frames=1):
+        """
+        Lets frames panel refresh frames pass, moving a running scroll.
+        """
+        if not self.scrolling or self.scroll_setup is None:
+            return
+        command, args = self.scroll_setup
+        if command not in (0x26, 0x27):
+            return
+        page_start, interval, page_end = args[1] & 0x07, args[2] & 0x07, args[3] & 0x07
+        before = self.scroll_frames // self.SCROLL_FRAMES[interval]
+        self.scroll_frames += frames
+        steps = (self.scroll_frames // self.SCROLL_FRAMES[interval] - before) % self.width
+        if command == 0x26:
+            steps = -steps % self.width
+        for page in range(page_start, page_end + 1):
+            start = page * self.width
+            row = self.ram[start:start + self.width]
+            self.ram[start:start + self.width] = row[steps:] + row[:steps]
+
+    def _write_ram(self, byte):
+        if self.scrolling:
+            self.writes_while_scrolling += 1
+        self.ram[self.page * self.width + self.column] = byte
+        col_start, col_end = self.column_window
+        page_start, page_end = self.page_window
+        if self.memory_mode == 0:
+            # Horizontal addressing: along the columns, then the next page
+            self.column += 1
+            if self.column > col_end:
+                self.column = col_start
+                self.page = self.page + 1 if self.page < page_end else page_start
+        elif self.memory_mode == 1:
+            # Vertical addressing: down the pages, then the next column
+            self.page += 1
+            if self.page > page_end:
+                self.page = page_start
+                self.column = self.column + 1 if self.column < col_end else col_start
+        else:
+            # Page addressing: wraps within the page
+            self.column = (self.column + 1) % self.width
+
+    def pixel(self, x, y):
+        return self.ram[(y // 8) * self.width + x] >> (y % 8) & 1
+
+    def image(self):
+        """
+        Returns:
+            Image: Mode '1' picture of the display RAM, as the program drew it.
+        """
+        image = Image.new('1', (self.width, self.pages * 8))
+        pixels = image.load()
+        for page in range(self.pages):
+            for x in range(self.width):
+                byte = self.ram[page * self.width + x]
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        pixels[x, page * 8 + bit] = 255
+        return image
+
+
+class INA219Model:
+    """
+    INA219 register file. The measured registers are derived from the load
+    set with set_load() and from the calibration register, like on the chip:
+    without calibration current and power read as zero.
+    """
+
+    def __init__(self, bus_voltage=8.1, current=120.0, shunt_ohms=0.1):
+        self.stats = BusStats()
+        self.shunt_ohms = shunt_ohms
+        self.pointer = 0
+        self.power_on_reset()
+        self.set_load(bus_voltage, current)
+
+    def power_on_reset(self):
+        """
+        Restores the power-on register values, e.g. to simulate a brownout.
+        """
+        self.registers = {0x00: 0x399F, 0x05: 0}
+
+    def set_load(self, bus_voltage, current):
+        """
+        Sets what the chip measures: bus voltage in V and current in mA
+        (positive while charging).
+        """
+        self.bus_voltage = bus_voltage
+        self.current = current
+
+    def _register(self, address):
+        if address == 0x01:
+            return round(self.current * self.shunt_ohms / 0.01)
+        if address == 0x02:
+            # Conversion ready bit set
+            return int(self.bus_voltage / 0.004) << 3 | 0x02
+        calibration = self.registers.get(0x05, 0)
+        current = self._register(0x01) * calibration // 4096
+        if address == 0x04:
+            return current
+        if address == 0x03:
+            return abs(current) * (self._register(0x02) >> 3) // 5000
+        return self.registers.get(address, 0)
+
+    def write(self, data):
+        self.stats.transactions += 1
+        self.stats.bytes_written += len(data)
+        self.pointer = data[0]
+        if len(data) >= 3 and self.pointer in (0x00, 0x05):
+            self.registers[self.pointer] = data[1] << 8 | data[2]
+
+    def read(self, length):
+        self.stats.transactions += 1
+        self.stats.bytes_read += length
+        value = self._register(self.pointer) & 0xFFFF
+        return ([value >> 8, value & 0xFF] * length)[:length]
+
+
+class PCF8574Model:
+    """
+    PCF8574 quasi-bidirectional port. A pin reads low when the program
+    drives it low or when something external (a pressed key) pulls it low.
+    """
+
+    def __init__(self):
+        self.stats = BusStats()
+        self.latch = 0xFF
+        self.external = 0xFF
+
+    def press(self, mask):
+        self.external &= ~mask & 0xFF
+
+    def release(self, mask):
+        self.external |= mask
+
+    def write(self, data):
+        self.stats.transactions += 1
+        self.stats.bytes_written += len(data)
+        self.latch = data[-1]
+
+    def read(self, length):
+        self.stats.transactions += 1
+        self.stats.bytes_read += length
+        return [self.latch & self.external] * length
+
+
+class SimSpiDev:
+    """
+    Stand-in for spidev.SpiDev, forwarding transfers to the device model
+    on (bus, device).
+    """
+
+    def __init__(self, board, bus=None, device=None):
+        self._board = board
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bufsiz = 4096
+        self._device = None
+        if bus is not None:
+            self.open(bus, device)
+
+    def open(self, bus, device):
+        self._device = self._board.spi_devices[(bus, device)]
+
+    def close(self):
+        self._device = None
+
+    def writebytes(self, data):
+        if len(data) > self.bufsiz:
+            raise OverflowError('Argument list size exceeds %d bytes.' % self.bufsiz)
+        self._device.transfer(bytes(data))
+
+    def writebytes2(self, data):
+        data = bytes(data)
+        for start in range(0, len(data), self.bufsiz):
+            self._device.transfer(data[start:start+self.bufsiz])
+
+    def xfer2(self, data):
+        self.writebytes(data)
+        return [0] * len(data)
+
+
+class I2CMessage:
+    """One message of a combined transaction, like smbus2.i2c_msg."""
+
+    def __init__(self, addr, read, data):
+        self.addr = addr
+        self.is_read = read
+        self.buf = list(data)
+        self.len = len(self.buf)
+
+    def __iter__(self):
+        return iter(self.buf)
+
+
+class i2c_msg:
+    @staticmethod
+    def read(address, length):
+        return I2CMessage(address, True, [0] * length)
+
+    @staticmethod
+    def write(address, data):
+        return I2CMessage(address, False, data)
+
+
+class SimSMBus:
+    """
+    Stand-in for smbus2.SMBus. Addresses without a device model fail with
+    the same OSError the kernel reports for a missing chip.
+    """
+
+    def __init__(self, board, bus=None):
+        self._board = board
+        self._devices = board.i2c_devices.get(bus, {}) if bus is not None else {}
+
+    def open(self, bus):
+        self._devices = self._board.i2c_devices.get(bus, {})
+
+    def close(self):
+        pass
+
+    def _device(self, address):
+        device = self._devices.get(address)
+        if device is None:
+            raise OSError(121, 'Remote I/O error')
+        return device
+
+    def read_byte(self, address):
+        with self._board.i2c_lock:
+            return self._device(address).read(1)[0]
+
+    def write_byte(self, address, value):
+        with self._board.i2c_lock:
+            self._device(address).write([value])
+
+    def read_byte_data(self, address, register):
+        return self.read_i2c_block_data(address, register, 1)[0]
+
+    def write_byte_data(self, address, register, value):
+        self.write_i2c_block_data(address, register, [value])
+
+    def read_i2c_block_data(self, address, register, length=32):
+        with self._board.i2c_lock:
+            device = self._device(address)
+            device.write([register])
+            return device.read(length)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self._board.i2c_lock:
+            self._device(address).write([register] + list(data))
+
+    def i2c_rdwr(self, *messages):
+        with self._board.i2c_lock:
+            for message in messages:
+                device = self._device(message.addr)
+                if message.is_read:
+                    message.buf = list(device.read(message.len))
+                else:
+                    device.write(message.buf)
+
+
+class Board:
+    """
+    Simulated Waveshare Pioneer600 with UPS HAT: SSD1306 on SPI 0.0 (D/C on
+    GPIO 16, reset on GPIO 19), INA219 at 0x42 and PCF8574 joystick/buzzer/LED
+    expander at 0x20 on I2C bus 1, joystick center key on GPIO 20.
+    """
+
+    CENTER_KEY = 20
+    ARROW_KEYS = {'left': 0x01, 'up': 0x02, 'down': 0x04, 'right': 0x08}
+
+    def __init__(self):
+        self.gpio = SimGPIO()
+        self.panel = SSD1306Model(self.gpio, dc=16, rst=19)
+        self.ina219 = INA219Model()
+        self.expander = PCF8574Model()
+        self.spi_devices = {(0, 0): self.panel}
+        self.i2c_devices = {1: {0x42: self.ina219, 0x20: self.expander}}
+        self.i2c_lock = threading.Lock()
+
+    def SpiDev(self, bus=None, device=None):
+        return SimSpiDev(self, bus, device)
+
+    def SMBus(self, bus=None):
+        return SimSMBus(self, bus)
+
+    def press(self, key):
+        if key == 'center':
+            self.gpio.set_input(self.CENTER_KEY, 0)
+        else:
+            self.expander.press(self.ARROW_KEYS[key])
+
+    def release(self, key):
+        if key == 'center':
+            self.gpio.set_input(self.CENTER_KEY, 1)
+        else:
+            self.expander.release(self.ARROW_KEYS[key])
+
+    def stats(self):
+        """
+        Returns:
+            dict: Traffic counters per device, plus GPIO reads and writes.
+        """
+        return {
+            'ssd1306': dict(self.panel.stats.as_dict(), command_bytes=self.panel.command_bytes,
+                            data_bytes=self.panel.data_bytes),
+            'ina219': self.ina219.stats.as_dict(),
+            'pcf8574': self.expander.stats.as_dict(),
+            'gpio': {'reads': self.gpio.reads, 'writes': self.gpio.writes, 'edges': self.gpio.edges},
+        }
+
+    def reset_stats(self):
+        self.panel.stats.reset()
+        self.panel.command_bytes = 0
+        self.panel.data_bytes = 0
+        self.ina219.stats.reset()
+        self.expander.stats.reset()
+        self.gpio.reads = self.gpio.writes = self.gpio.edges = 0
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+
+
+# Only light modules here: this runs before anything else is imported
+
+_imported = time.perf_counter()
+
+# Where the last frame and metric values are kept between runs
+SNAPSHOT_DIR = os.environ.get('PIDASHBOARD_SNAPSHOT_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'piDashboard'))
+
+# Metrics never kept between runs: the battery state from before a reboot
+# must not pick the power profile or shut the Pi down again
+LIVE_ONLY_METRICS = ('ups', 'power_profile')
+
+
+def process_age():
+    """
+    Returns:
+        float: Seconds since the process was started, including the
+               interpreter start-up (since this module was imported if /proc
+               can't tell).
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # starttime, field 22, counted after the parenthesized command name
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - _imported
+
+
+def splash_frame(width, height):
+    """
+    Returns:
+        bytearray: Display buffer with the start-up splash.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    from SSD1306 import pack_buffer
+    image = Image.new('1', (width, height))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.rectangle((0, 0, width-1, height-1), outline=255, fill=0)
+    draw.text((30, 20), "piDashboard", font=font, fill=255)
+    draw.text((36, 34), "starting...", font=font, fill=255)
+    # Without NumPy, importing it would take longer than packing one frame
+    return pack_buffer(image.tobytes(), width, height // 8, allow_numpy=False)
+
+
+class Snapshot:
+    """
+    The last home screen frame and metric values, kept on disk so the next
+    start can show them while the collectors warm up. The metrics in
+    live_only are neither saved nor restored.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, live_only=LIVE_ONLY_METRICS):
+        self.frame_path = os.path.join(directory, 'frame.bin')
+        self.metrics_path = os.path.join(directory, 'metrics.json')
+        self.live_only = set(live_only)
+
+    def load_frame(self, size):
+        """
+        Returns:
+            bytes: The saved display buffer, None if there is none of that size.
+        """
+        try:
+            with open(self.frame_path, 'rb') as f:
+                frame = f.read()
+        except OSError:
+            return None
+        return frame if len(frame) == size else None
+
+    def load_metrics(self):
+        """
+        Returns:
+            tuple: ({name: value}, age in seconds) of the saved metrics,
+                   ({}, 0) if there are none.
+        """
+        try:
+            with open(self.metrics_path) as f:
+                saved = json.load(f)
+            # Also skipped here, an older run may have saved them
+            metrics = {name: value for name, value in saved['metrics'].items() if name not in self.live_only}
+            return metrics, max(time.time() - saved['time'], 0)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}, 0
+
+    def save(self, frame, metrics):
+        """
+        Saves a display buffer (None keeps the saved one) and a
+        CollectorRegistry.snapshot(), each replaced atomically.
+        """
+        os.makedirs(os.path.dirname(self.frame_path), exist_ok=True)
+        if frame is not None:
+            self._replace(self.frame_path, 'wb', bytes(frame))
+        values = {name: reading.value for name, (reading, _) in metrics.items()
+                  if reading.value is not None and name not in self.live_only}
+        self._replace(self.metrics_path, 'w', json.dumps({'time': time.time(), 'metrics': values}))
+
+    def _replace(self, path, mode, data):
+        temp = path + '.tmp'
+        with open(temp, mode) as f:
+            f.write(data)
+        os.replace(temp, path)
@@ -0,0 +1,184 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+import collectors
+from collectors import CPUTempReader, ExternalIPResolver
+
+
+class IPService(http.server.ThreadingHTTPServer):
+    """
+    Stand-in for the external IP service on localhost. mode is 'ok', 'error'
+    or 'slow', on_request is called in the handler before it answers.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), IPHandler)
+        self.mode = 'ok'
+        self.address = '203.0.113.7'
+        self.requests = 0
+        self.on_request = None
+        self.release = threading.Event()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+
+class IPHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.on_request is not None:
+            self.server.on_request()
+        if self.server.mode == 'slow':
+            self.server.release.wait(5)
+        if self.server.mode == 'error':
+            self.send_error(503)
+            return
+        body = self.server.address.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def service():
+    service = IPService()
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    yield service
+    service.release.set()
+    service.shutdown()
+    service.server_close()
+
+
+class RecordingWakeup(threading.Event):
+    """Records the delays the resolver waits for instead of waiting."""
+
+    def __init__(self, resolver, waits):
+        super().__init__()
+        self.resolver = resolver
+        self.waits = waits
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        if len(self.delays) == self.waits:
+            self.resolver._stopped.set()
+        return False
+
+
+def test_slow_service_times_out(service):
+    service.mode = 'slow'
+    resolver = ExternalIPResolver(url=service.url, timeout=(0.5, 0.2))
+    started = time.monotonic()
+    assert resolver.fetch() is None
+    assert time.monotonic() - started < 2
+    resolver.stop()
+
+
+def test_backoff_doubles_up_to_the_limit_and_resets(service):
+    service.mode = 'error'
+    resolver = ExternalIPResolver(url=service.url, interval=900, min_backoff=5, max_backoff=30)
+    resolver._wakeup = RecordingWakeup(resolver, 6)
+    resolver._run()
+    assert resolver._wakeup.delays == [5, 10, 20, 30, 30, 30]
+    assert resolver.errors == 6
+
+    # One good lookup goes back to the regular interval and the shortest backoff
+    service.mode = 'ok'
+    resolver._stopped.clear()
+    resolver._wakeup = RecordingWakeup(resolver, 1)
+    resolver._run()
+    service.mode = 'error'
+    resolver._stopped.clear()
+    resolver._wakeup = RecordingWakeup(resolver, 1)
+    resolver._run()
+    assert resolver._wakeup.delays == [5]
+    resolver.stop()
+
+
+def test_last_address_is_served_while_the_service_fails(service):
+    updates = []
+    resolver = ExternalIPResolver(url=service.url, on_update=updates.append)
+    resolver._wakeup = RecordingWakeup(resolver, 1)
+    resolver._run()
+    assert resolver.get() == '203.0.113.7'
+
+    service.mode = 'error'
+    resolver._stopped.clear()
+    resolver._wakeup = RecordingWakeup(resolver, 3)
+    resolver._run()
+    assert resolver.get() == '203.0.113.7'
+    assert updates == ['203.0.113.7']
+    resolver.stop()
+
+
+def test_refresh_during_a_lookup_is_not_lost(service):
+    resolver = ExternalIPResolver(url=service.url, interval=60)
+    # The interface changes while the first lookup is in flight
+    service.on_request = lambda: service.requests == 1 and resolver.refresh_now()
+    resolver.start()
+    deadline = time.monotonic() + 5
+    while service.requests < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    resolver.stop()
+    assert service.requests >= 2
+
+
+def thermal_zone(root, n, zone_type, temp):
+    zone = root / f'thermal_zone{n}'
+    zone.mkdir()
+    if zone_type is not None:
+        (zone / 'type').write_text(zone_type + '\n')
+    if temp is not None:
+        (zone / 'temp').write_text(f'{temp}\n')
+    return zone
+
+
+def test_cpu_zone_is_read_among_others(tmp_path):
+    thermal_zone(tmp_path, 0, 'gpu-thermal', 41000)
+    cpu = thermal_zone(tmp_path, 1, 'cpu-thermal', 48312)
+    reader = CPUTempReader(sysfs_root=str(tmp_path))
+    assert reader.read() == 48.3
+    # The same open file is read again, and sees the new value
+    (cpu / 'temp').write_text('51950\n')
+    assert reader.read() == 52.0
+    assert reader.read_all() == {'gpu-thermal': 41.0, 'cpu-thermal': 52.0}
+    reader.close()
+
+
+def test_missing_or_unreadable_zone_reads_none(tmp_path):
+    thermal_zone(tmp_path, 0, 'cpu_thermal', None)
+    garbled = thermal_zone(tmp_path, 1, 'soc', None)
+    (garbled / 'temp').write_text('not a number\n')
+    unreadable = thermal_zone(tmp_path, 2, None, None)
+    (unreadable / 'temp').mkdir()
+    reader = CPUTempReader(sysfs_root=str(tmp_path))
+    assert reader.read() is None
+    # A zone without a type is named after its directory
+    assert reader.read_all() == {'cpu_thermal': None, 'soc': None, 'thermal_zone2': None}
+    reader.close()
+
+
+def test_zone_appearing_later_is_opened(tmp_path):
+    zone = thermal_zone(tmp_path, 0, 'cpu-thermal', None)
+    reader = CPUTempReader(sysfs_root=str(tmp_path))
+    assert reader.read() is None
+    (zone / 'temp').write_text('45000\n')
+    assert reader.read() == 45.0
+    reader.close()
+
+
+def test_no_thermal_zones_falls_back_to_vcgencmd(tmp_path, monkeypatch):
+    monkeypatch.setattr(collectors, 'get_cpu_temp', lambda: 47.2)
+    reader = CPUTempReader(sysfs_root=str(tmp_path))
+    assert reader.read() == 47.2
+    assert reader.read_all() == {}
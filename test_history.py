@@ -0,0 +1,79 @@
+import pytest
+
+from history import HistoryStore, MINUTE_TIER, QUARTER_TIER, RAW_SPAN
+
+
+# Aligned to every bucket size
+T0 = 1000 * 24 * 60 * 60
+
+
+def store(now):
+    return HistoryStore(['power'], raw_interval=5, clock=lambda: now[0])
+
+
+def fill(history, start, end, step, value):
+    for t in range(start, end, step):
+        history.record('power', value, t)
+
+
+def test_raw_window_is_exact():
+    now = [T0 + 300]
+    history = store(now)
+    # Exactly on the window start counts, a sample before it doesn't
+    history.record('power', 90.0, T0 - 5)
+    history.record('power', 50.0, T0)
+    fill(history, T0 + 5, T0 + 295, 5, 1.0)
+    history.record('power', 7.0, T0 + 295)
+    low, high, avg = history.stats('power', 300)
+    assert (low, high) == (1.0, 50.0)
+    assert avg == pytest.approx((50.0 + 58 * 1.0 + 7.0) / 60)
+    assert history.stats('power', 60) == (1.0, 7.0, pytest.approx((11 * 1.0 + 7.0) / 12))
+
+
+def test_minute_tier_weights_buckets_by_samples():
+    # 59 minutes at 10 W, then 55 seconds at 100 W
+    now = [T0 + 3600]
+    history = store(now)
+    fill(history, T0, T0 + 59*60, 5, 10.0)
+    fill(history, T0 + 59*60, T0 + 59*60 + 55, 5, 100.0)
+    assert 3600 > RAW_SPAN
+    assert history.average('power', 3600) == pytest.approx((708 * 10 + 11 * 100) / 719)
+    series = history.series('power', 3600, 60)
+    assert series[0] == pytest.approx(10.0)
+    assert series[-1] == pytest.approx(100.0)
+
+
+def test_minute_tier_leaves_out_the_bucket_straddling_the_window_start():
+    now = [T0 + 3600 + 30]
+    history = store(now)
+    fill(history, T0, T0 + 3600 + 30, 5, 10.0)
+    # In the minute bucket starting at T0, 20 s before the window starts
+    history.record('power', 1000.0, T0 + 10)
+    low, high, avg = history.stats('power', 3600)
+    assert high == 10.0
+    assert avg == pytest.approx(10.0)
+    # A spike inside the window counts in full
+    history.record('power', 1000.0, T0 + 3600 + 25)
+    assert history.stats('power', 3600)[1] == 1000.0
+
+
+def test_quarter_tier_covers_windows_over_a_day():
+    day = 24 * 60 * 60
+    assert 2 * day > MINUTE_TIER[1]
+    now = [T0 + 3 * day]
+    history = store(now)
+    for n, value in enumerate((1.0, 2.0, 3.0)):
+        fill(history, T0 + n * day, T0 + (n + 1) * day, 300, value)
+    # Day one is outside, the samples not rolled up yet are inside
+    assert history.stats('power', 2 * day) == (2.0, 3.0, pytest.approx(2.5))
+    series = history.series('power', 2 * day, 2)
+    assert series == [pytest.approx(2.0), pytest.approx(3.0)]
+    assert history.stats('power', 2 * day - QUARTER_TIER[0])[0] == 2.0
+
+
+def test_failed_reads_are_skipped():
+    now = [T0]
+    history = store(now)
+    history.record('power', None, T0)
+    assert history.stats('power', 60) is None
+    assert history.series('power', 60, 3) == [None, None, None]
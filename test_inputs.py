@@ -0,0 +1,95 @@
+import os
+# The center key is read through the HAL's GPIO
+os.environ.setdefault('PIDASHBOARD_HAL', 'sim')
+
+import pytest
+
+import hal
+from inputs import InputManager, CENTER_KEY
+
+
+pytestmark = pytest.mark.skipif(hal.board is None, reason='needs PIDASHBOARD_HAL=sim')
+
+
+class FakeExpander:
+    """The key pins of a PCF8574, all released (high)."""
+
+    def __init__(self):
+        self.value = 0xFF
+
+    def read(self):
+        return self.value
+
+    def write(self, mask, value):
+        pass
+
+
+def events(inputs):
+    return [(event.key, event.kind, event.timestamp) for event in inputs.pending()]
+
+
+@pytest.fixture
+def expander():
+    return FakeExpander()
+
+
+@pytest.fixture
+def center():
+    hal.board.gpio.set_input(CENTER_KEY, 1)
+    yield lambda pressed: hal.board.gpio.set_input(CENTER_KEY, 0 if pressed else 1)
+    hal.board.gpio.set_input(CENTER_KEY, 1)
+
+
+def test_bounces_within_debounce_are_ignored(expander):
+    inputs = InputManager(expander, debounce=0.03)
+    expander.value = 0xFF & ~0x01
+    inputs._scan_arrows(10.0)
+    # Contact bounce: open and closed again within 30 ms
+    expander.value = 0xFF
+    inputs._scan_arrows(10.01)
+    expander.value = 0xFF & ~0x01
+    inputs._scan_arrows(10.02)
+    expander.value = 0xFF
+    inputs._scan_arrows(10.2)
+    assert events(inputs) == [('left', 'press', 10.0), ('left', 'release', 10.2)]
+
+
+def test_long_press_is_reported_once(expander):
+    inputs = InputManager(expander, long_press=1.0)
+    expander.value = 0xFF & ~0x02
+    inputs._scan_arrows(5.0)
+    assert inputs._check_held(5.5)
+    assert inputs._check_held(6.0)
+    assert inputs._check_held(6.5)
+    expander.value = 0xFF
+    inputs._scan_arrows(7.0)
+    assert not inputs._check_held(7.0)
+    assert events(inputs) == [('up', 'press', 5.0), ('up', 'long', 6.0), ('up', 'release', 7.0)]
+
+
+def test_short_press_of_a_long_press_key_waits_for_release(expander, center):
+    inputs = InputManager(expander, long_press_keys=('center',))
+    center(True)
+    inputs._update('center', True, 1.0)
+    inputs._check_held(1.5)
+    assert events(inputs) == []
+    center(False)
+    inputs._update('center', False, 1.6)
+    assert events(inputs) == [('center', 'press', 1.6), ('center', 'release', 1.6)]
+
+
+def test_long_press_suppresses_the_short_press(expander, center):
+    inputs = InputManager(expander, long_press=1.0, long_press_keys=('center',))
+    center(True)
+    inputs._update('center', True, 1.0)
+    inputs._check_held(2.1)
+    center(False)
+    # The release edge was lost, the held check notices the key is up
+    inputs._check_held(2.5)
+    assert events(inputs) == [('center', 'long', 2.1), ('center', 'release', 2.5)]
+
+
+def test_poller_slows_down_when_idle(expander):
+    inputs = InputManager(expander, poll_interval=0.02, idle_poll_interval=0.1, idle_after=5)
+    assert inputs._poll_interval(104.9, 100.0) == 0.02
+    assert inputs._poll_interval(105.0, 100.0) == 0.1
@@ -0,0 +1,80 @@
+import errno
+import socket
+import time
+
+import netmon
+from netmon import InterfaceMonitor
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FlakyNetlink:
+    """
+    Stands in for the rtnetlink socket: reading the first socket fails,
+    opening fails once opens reaches fail_open.
+    """
+
+    def __init__(self, monitor, fail_open=None):
+        self.monitor = monitor
+        self.fail_open = fail_open
+        self.opens = 0
+        self.sockets = []
+
+    def open(self):
+        self.opens += 1
+        if self.opens == self.fail_open:
+            self.monitor._socket = None
+            self.monitor.netlink = False
+            return
+        sock, other = socket.socketpair()
+        other.close()
+        self.sockets.append(sock)
+        self.monitor._socket = sock
+        self.monitor.netlink = True
+
+    def wait_for_change(self, timeout):
+        if self.monitor._socket is self.sockets[0]:
+            raise OSError(errno.EBADF, 'Bad file descriptor')
+        self.monitor._stopped.wait(timeout)
+        return False
+
+
+def test_netlink_error_reopens_the_socket(monkeypatch):
+    reads = []
+    monitor = InterfaceMonitor(read=lambda: reads.append(1) or {}, poll_interval=0.01)
+    netlink = FlakyNetlink(monitor)
+    monkeypatch.setattr(monitor, '_open_netlink', netlink.open)
+    monkeypatch.setattr(monitor, '_wait_for_change', netlink.wait_for_change)
+    monitor.start()
+    try:
+        assert wait_for(lambda: netlink.opens == 2 and len(reads) >= 2)
+        assert monitor._thread.is_alive()
+        assert monitor.netlink
+        assert monitor.errors == 1
+        assert netlink.sockets[0].fileno() == -1
+    finally:
+        monitor.stop()
+    assert netlink.sockets[1].fileno() == -1
+
+
+def test_netlink_error_falls_back_to_polling(monkeypatch):
+    signatures = iter(['eth0 up', 'eth0 up', 'wlan0 up'])
+    monkeypatch.setattr(netmon, 'get_network_signature', lambda: next(signatures, 'wlan0 up'))
+    reads = []
+    monitor = InterfaceMonitor(read=lambda: reads.append(1) or {}, poll_interval=0.01)
+    netlink = FlakyNetlink(monitor, fail_open=2)
+    monkeypatch.setattr(monitor, '_open_netlink', netlink.open)
+    monkeypatch.setattr(monitor, '_wait_for_change', netlink.wait_for_change)
+    monitor.start()
+    try:
+        # The read after the error, then the signature change seen by polling
+        assert wait_for(lambda: len(reads) >= 3)
+        assert monitor._thread.is_alive()
+        assert not monitor.netlink
+    finally:
+        monitor.stop()
@@ -0,0 +1,104 @@
+import os
+# The dashboard picks the simulated backends with the simulated HAL
+os.environ.setdefault('PIDASHBOARD_HAL', 'sim')
+
+import random
+import threading
+
+import pytest
+
+import hal
+import sensors
+from sensors import SensorPoller, SimulatedBMP280, SimulatedDHT22, SimulatedMHZ19, BMP280Backend
+
+
+pytestmark = pytest.mark.skipif(hal.board is None, reason='needs PIDASHBOARD_HAL=sim')
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    state = random.getstate()
+    random.seed(7)
+    yield
+    random.setstate(state)
+
+
+class FlakyBackend:
+    """Raises error on the first failures reads, then returns the read count."""
+
+    def __init__(self, error, failures):
+        self.error = error
+        self.failures = failures
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        if self.reads <= self.failures:
+            raise self.error
+        return {'value': self.reads}
+
+
+def test_simulated_backend_is_picked():
+    assert sensors.backend(BMP280Backend, SimulatedBMP280) is SimulatedBMP280
+
+
+def test_simulated_readings_stay_near_their_setpoint():
+    bmp280 = SimulatedBMP280(temperature=20.0, pressure=1000.0)
+    co2 = SimulatedMHZ19(co2=800)
+    for _ in range(200):
+        reading = bmp280.read()
+        assert 19.9 <= reading['temperature'] <= 20.1
+        assert 999.8 <= reading['pressure'] <= 1000.2
+        assert 785 <= co2.read()['co2'] <= 815
+
+
+def test_simulated_dht22_fails_like_the_real_one():
+    dht22 = SimulatedDHT22(failure_rate=0.3)
+    failures = 0
+    for _ in range(1000):
+        try:
+            reading = dht22.read()
+        except RuntimeError:
+            failures += 1
+            continue
+        assert 21.8 <= reading['temperature'] <= 22.2
+        assert 39.0 <= reading['humidity'] <= 41.0
+    assert 250 <= failures <= 350
+
+
+def test_checksum_failures_are_retried():
+    poller = SensorPoller('dht22', lambda: FlakyBackend(RuntimeError('Checksum'), 2), 5,
+                          retries=3, retry_delay=0)
+    assert poller.read() == {'value': 3}
+    assert poller.errors == 2
+    assert poller.last_error == 'Checksum'
+
+
+def test_missing_sensor_is_reopened_without_retries():
+    opened = []
+    def open_backend():
+        # Unplugged on the first open only
+        opened.append(FlakyBackend(OSError('No such device'), 0 if opened else 1))
+        return opened[-1]
+    poller = SensorPoller('bmp280', open_backend, 2, retries=3, retry_delay=0)
+    assert poller.read() is None
+    assert len(opened) == 1 and opened[0].reads == 1
+    # The next read opens the sensor again
+    assert poller.read() == {'value': 1}
+    assert len(opened) == 2
+
+
+def test_poller_thread_publishes_simulated_readings():
+    published = threading.Event()
+    updates = []
+    def on_update(value):
+        updates.append(value)
+        published.set()
+    poller = SensorPoller('co2', SimulatedMHZ19, 10, on_update=on_update).start()
+    try:
+        assert published.wait(5)
+    finally:
+        poller.stop()
+    assert poller.get() == updates[0]
+    assert poller.timestamp is not None
+    assert poller.consecutive_errors == 0
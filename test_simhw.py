@@ -0,0 +1,147 @@
+import os
+# These tests drive the drivers against the simulated Pioneer600
+os.environ.setdefault('PIDASHBOARD_HAL', 'sim')
+
+import random
+
+import pytest
+
+import hal
+import SSD1306
+from INA219 import INA219, INA219Sampler
+from layouts import networkScreen
+
+
+pytestmark = pytest.mark.skipif(hal.board is None, reason='needs PIDASHBOARD_HAL=sim')
+
+
+@pytest.fixture
+def disp():
+    disp = SSD1306.SSD1306(19, 16, hal.SpiDev(0, 0))
+    disp.begin()
+    disp.display()
+    hal.board.reset_stats()
+    return disp
+
+
+def test_panel_ram_follows_partial_refresh_and_scroll(disp):
+    rng = random.Random(1)
+    size = disp.width * disp.height // 8
+    buffer = bytearray(rng.getrandbits(8) for _ in range(size))
+    for _ in range(500):
+        action = rng.random()
+        if action < 0.5:
+            # Change a few columns of a few pages
+            for _ in range(rng.randint(1, 4)):
+                start = rng.randrange(size)
+                for i in range(start, min(start + rng.randint(1, 40), size)):
+                    buffer[i] = rng.getrandbits(8)
+            disp.set_buffer(bytearray(buffer))
+        elif action < 0.7:
+            page_start = rng.randrange(disp.height // 8)
+            disp.scroll_pages(page_start, rng.randrange(page_start, disp.height // 8), rng.randint(-5, 5))
+            buffer = bytearray(disp.get_buffer())
+        elif action < 0.85:
+            page_start = rng.randrange(disp.height // 8)
+            disp.start_scroll(page_start, rng.randrange(page_start, disp.height // 8),
+                              left=rng.random() < 0.5, frames=rng.choice(sorted(SSD1306.SCROLL_INTERVALS)))
+        else:
+            disp.stop_scroll()
+        disp.display()
+        ram = bytes(hal.board.panel.ram)
+        if disp.scrolling is None or disp.frame_bytes_sent:
+            assert ram == disp.get_buffer()
+        else:
+            # Unchanged frame while scrolling: only the scrolled pages moved
+            page_start, page_end = disp.scrolling[:2]
+            outside = [page for page in range(disp.height // 8) if not page_start <= page <= page_end]
+            for page in outside:
+                assert ram[page*128:(page+1)*128] == disp.get_buffer()[page*128:(page+1)*128]
+        hal.board.panel.tick(rng.randint(0, 30))
+    disp.stop_scroll()
+    assert hal.board.panel.writes_while_scrolling == 0
+
+
+def test_display_restarts_a_scroll_around_changes(disp):
+    panel = hal.board.panel
+    disp.set_buffer(bytearray(range(256)) * 4)
+    disp.display()
+    disp.start_scroll(2, 3, left=True, frames=2)
+    panel.tick(10)
+    # Five columns to the left
+    assert panel.ram[2*128:2*128+3] == disp.get_buffer()[2*128+5:2*128+8]
+    assert panel.ram[:2*128] == disp.get_buffer()[:2*128]
+
+    # Nothing changed: the scroll keeps running, nothing is sent
+    hal.board.reset_stats()
+    disp.display()
+    assert hal.board.stats()['ssd1306']['data_bytes'] == 0
+    assert panel.scrolling
+
+    # A change outside the scrolled pages still rewrites them, from the
+    # unscrolled buffer, with the scroll stopped while the RAM is written
+    buffer = bytearray(disp.get_buffer())
+    buffer[6*128] ^= 0xFF
+    disp.set_buffer(buffer)
+    disp.display()
+    assert bytes(panel.ram) == disp.get_buffer()
+    assert panel.writes_while_scrolling == 0
+    assert panel.scrolling and disp.scrolling == (2, 3, True, 2)
+
+    disp.stop_scroll()
+    panel.tick(10)
+    disp.display()
+    assert bytes(panel.ram) == disp.get_buffer()
+    assert not panel.scrolling
+
+
+def test_marquee_step_repacks_only_the_field(disp):
+    screen = networkScreen
+    screen.update({'interface_name': 'wlan0', 'internal_ip': '2001:db8:85a3::8a2e:370:7334',
+                   'user': 'pi', 'external_ip': '203.0.113.7', 'throughput': '-'})
+    screen.take_dirty_rows()
+    disp.image(screen.image)
+    disp.display()
+    assert screen.overflowing()
+
+    hal.board.reset_stats()
+    assert screen.advance(2)
+    y0, y1 = screen.take_dirty_rows()
+    disp.image_rows(screen.image, y0, y1)
+    disp.display()
+    assert disp.get_buffer() == bytes(SSD1306.pack_buffer(screen.image.tobytes(), 128, 8))
+    assert bytes(hal.board.panel.ram) == disp.get_buffer()
+    # Only the pages under the internal IP field were sent
+    pages = set(range(y0 // 8, (y1 + 7) // 8))
+    assert hal.board.stats()['ssd1306']['data_bytes'] <= len(pages) * 128
+
+
+def test_unchanged_frame_sends_no_data(disp):
+    disp.set_buffer(bytearray(range(256)) * 4)
+    disp.display()
+    hal.board.reset_stats()
+    disp.display()
+    assert hal.board.stats()['ssd1306']['data_bytes'] == 0
+    assert disp.frame_bytes_sent == 0
+
+
+def test_ina219_sample_is_one_combined_transaction(monkeypatch):
+    ina219 = INA219(addr=0x42)
+    sampler = INA219Sampler(ina219)
+    calls = []
+    i2c_rdwr = ina219.bus._bus.i2c_rdwr
+    def counting_rdwr(*messages):
+        calls.append(messages)
+        return i2c_rdwr(*messages)
+    monkeypatch.setattr(ina219.bus._bus, 'i2c_rdwr', counting_rdwr)
+    before = ina219.bus.device_stats()['ina219']['transactions']
+    hal.board.reset_stats()
+
+    sampler.sample()
+
+    assert len(calls) == 1
+    # Pointer write and read of the bus voltage and the current registers
+    assert [message.is_read for message in calls[0]] == [False, True, False, True]
+    assert ina219.bus.device_stats()['ina219']['transactions'] - before == 1
+    assert hal.board.stats()['ina219']['bytes_read'] == 4
+    assert sampler.average()['samples'] == 1
@@ -0,0 +1,86 @@
+import os
+# The driver imports GPIO from the HAL, run it against the simulator
+os.environ.setdefault('PIDASHBOARD_HAL', 'sim')
+
+import random
+
+import pytest
+from PIL import Image
+
+import SSD1306
+
+
+WIDTH = 128
+HEIGHT = 64
+PAGES = HEIGHT // 8
+
+
+def reference_pack(image):
+    """The original per-pixel loop of SSD1306.image()"""
+    buffer = [0] * (WIDTH * PAGES)
+    pix = image.load()
+    index = 0
+    for page in range(PAGES):
+        for x in range(WIDTH):
+            bits = 0
+            for bit in [0, 1, 2, 3, 4, 5, 6, 7]:
+                bits = bits << 1
+                bits |= 0 if pix[(x, page*8+7-bit)] == 0 else 1
+            buffer[index] = bits
+            index += 1
+    return bytes(buffer)
+
+
+def random_image(seed):
+    rng = random.Random(seed)
+    image = Image.new('1', (WIDTH, HEIGHT))
+    image.putdata([rng.choice((0, 255)) for _ in range(WIDTH * HEIGHT)])
+    return image
+
+
+def single_pixel(x, y):
+    image = Image.new('1', (WIDTH, HEIGHT))
+    image.putpixel((x, y), 255)
+    return image
+
+
+IMAGES = (
+    [('black', Image.new('1', (WIDTH, HEIGHT), 0)),
+     ('white', Image.new('1', (WIDTH, HEIGHT), 255))]
+    # First and last row of every page, at the edges and in the middle
+    + [(f'pixel {x},{y}', single_pixel(x, y))
+       for y in sorted({page*8 for page in range(PAGES)} | {page*8+7 for page in range(PAGES)})
+       for x in (0, 7, 8, 63, 127)]
+    + [(f'random {seed}', random_image(seed)) for seed in range(20)]
+)
+
+
+@pytest.fixture(params=IMAGES, ids=[name for name, _ in IMAGES])
+def image(request):
+    return request.param[1]
+
+
+def test_pack_python_matches_pixel_loop(image):
+    assert bytes(SSD1306._pack_python(image.tobytes(), WIDTH, PAGES)) == reference_pack(image)
+
+
+def test_pack_numpy_matches_pixel_loop(image):
+    if SSD1306.load_numpy() is None:
+        pytest.skip('NumPy is not installed')
+    assert bytes(SSD1306._pack_numpy(image.tobytes(), WIDTH, PAGES)) == reference_pack(image)
+
+
+def test_pack_buffer_without_numpy(image):
+    assert bytes(SSD1306.pack_buffer(image.tobytes(), WIDTH, PAGES, allow_numpy=False)) == reference_pack(image)
+
+
+def test_image_rows_repacks_only_those_pages():
+    disp = SSD1306.SSD1306(19, 16, __import__('hal').SpiDev(0, 0))
+    before = random_image(100)
+    after = random_image(101)
+    disp.image(before)
+    disp.image_rows(after, 13, 30)
+    # Rows 13 to 29 lie in pages 1 to 3
+    expected = bytearray(reference_pack(before))
+    expected[128:4*128] = reference_pack(after)[128:4*128]
+    assert disp.get_buffer() == bytes(expected)
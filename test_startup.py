@@ -0,0 +1,47 @@
+from collectors import CollectorRegistry
+from power import PowerManager
+from startup import Snapshot
+
+
+LOW_BATTERY = {'bus_voltage': 6.2, 'shunt_voltage': -0.08, 'current': -800.0, 'power': 5.0,
+               'percent': 5.0, 'samples': 10}
+
+
+def registry(clock):
+    metrics = CollectorRegistry(clock=clock)
+    metrics.register('cpu_temp', None, 2)
+    metrics.register('ups', None, 2)
+    metrics.register('power_profile', None, 60)
+    return metrics
+
+
+def test_low_battery_snapshot_does_not_shut_down(tmp_path):
+    now = [100.0]
+    clock = lambda: now[0]
+    before = registry(clock)
+    before.publish('cpu_temp', 48.3)
+    before.publish('ups', LOW_BATTERY)
+    before.publish('power_profile', {'profile': 'battery', 'average_power': {'battery': 5.0}})
+    Snapshot(tmp_path).save(None, before.snapshot())
+
+    # The next start, right after the reboot
+    after = registry(clock)
+    values, age = Snapshot(tmp_path).load_metrics()
+    after.restore(values, age)
+    power_manager = PowerManager(clock=clock)
+
+    assert after.value('cpu_temp') == 48.3
+    assert after.get('ups').value is None
+    assert after.get('power_profile').value is None
+    assert not power_manager.shutdown_due()
+
+    # Only a reading of this run can shut down
+    power_manager.update(LOW_BATTERY)
+    assert power_manager.shutdown_due()
+
+
+def test_battery_state_of_an_older_snapshot_is_ignored(tmp_path):
+    (tmp_path / 'metrics.json').write_text(
+        '{"time": 0, "metrics": {"ups": {"percent": 5, "current": -800}, "ram": [100, 400]}}')
+    values, _ = Snapshot(tmp_path).load_metrics()
+    assert values == {'ram': [100, 400]}